@@ -57,16 +57,94 @@ def get_trakt_config():
     return config.get("trakt", {})
 
 
-def get_radarr_config():
+def _get_instances(service):
+    """Get a service's instances; a single mapping is one instance named "default"."""
     config = load_config()
-    return config.get("radarr", {})
+    section = config.get(service) or {}
+    if isinstance(section, dict):
+        return [{**section, "name": section.get("name", "default")}]
+    return [{**instance, "name": instance.get("name", f"{service}{i + 1}")} for i, instance in enumerate(section)]
+
+
+def get_radarr_instances():
+    return _get_instances("radarr")
+
+
+def get_sonarr_instances():
+    return _get_instances("sonarr")
+
+
+def get_radarr_config():
+    """Get the first (default) Radarr instance."""
+    instances = get_radarr_instances()
+    return instances[0] if instances else {}
 
 
 def get_sonarr_config():
-    config = load_config()
-    return config.get("sonarr", {})
+    """Get the first (default) Sonarr instance."""
+    instances = get_sonarr_instances()
+    return instances[0] if instances else {}
 
 
 def get_plex_config():
     config = load_config()
     return config.get("plex", {})
+
+
+def get_fanout_config():
+    config = load_config()
+    return config.get("fanout", {})
+
+
+def get_cache_config():
+    config = load_config()
+    return config.get("cache", {})
+
+
+def get_poller_config():
+    config = load_config()
+    return config.get("poller", {})
+
+
+def get_search_config():
+    config = load_config()
+    return config.get("search", {})
+
+
+def get_catalogue_config():
+    config = load_config()
+    return config.get("catalogue", {})
+
+
+def get_images_config():
+    config = load_config()
+    return config.get("images", {})
+
+
+def get_enrichment_config():
+    config = load_config()
+    return config.get("enrichment", {})
+
+
+def get_jobs_config():
+    config = load_config()
+    return config.get("jobs", {})
+
+
+def get_bulk_config():
+    config = load_config()
+    return config.get("bulk", {})
+
+
+def get_webhooks_config():
+    """Get the webhooks section, with `token` as a string even if YAML read it as a number."""
+    config = load_config()
+    section = config.get("webhooks") or {}
+    if section.get("token") is not None:
+        return {**section, "token": str(section["token"])}
+    return section
+
+
+def get_metrics_config():
+    config = load_config()
+    return config.get("metrics", {})
@@ -1,6 +1,10 @@
 from flask import Flask
 from app.routes.api import api
+from app.routes.images import images
 from app.routes.views import views
+from app.routes.webhooks import webhooks
+from app.services import metrics
+from app.services.poller import start_pollers
 
 
 def create_app():
@@ -8,7 +12,13 @@ def create_app():
 
     # Register blueprints
     app.register_blueprint(api)
+    app.register_blueprint(images)
     app.register_blueprint(views)
+    app.register_blueprint(webhooks)
+
+    # Keep library status precomputed in the background
+    start_pollers()
+    metrics.start()
 
     return app
 
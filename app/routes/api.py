@@ -1,136 +1,358 @@
-from flask import Blueprint, jsonify, request
-from app.services import tmdb, trakt, radarr, sonarr
-from app.config import get_plex_config
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import requests
+from flask import Blueprint, Response, g, jsonify, request
+from app.services import tmdb, radarr, sonarr, fanout, cache, poller, events, metrics, upstream, search_index, models, catalogue, bulk, jobs, annotate
+from app.services.breaker import CircuitOpenError
+from app.config import get_plex_config, get_search_config, get_catalogue_config, get_bulk_config
 
 api = Blueprint("api", __name__, url_prefix="/api")
 
+EVENT_STREAM_HEARTBEAT = 15  # Seconds between keepalive comments
+EVENT_STREAM_MAX_AGE = 300  # Seconds before a stream is closed so the worker thread is recycled
+TYPEAHEAD_MIN_LENGTH = 2
+TYPEAHEAD_CLIENTS = 1024  # Type-ahead clients whose latest query sequence number is remembered
+MAX_STATUS_ITEMS = 1000  # Items per library status request
+
+_typeahead_seqs = OrderedDict()
+_typeahead_lock = threading.Lock()
+_event_streams = 0
+_event_streams_lock = threading.Lock()
+
+
+def _max_event_streams():
+    """Streams one worker may hold open, or None for no limit.
+
+    Threaded workers (see gunicorn.conf.py) spend a thread per open stream,
+    so only a quarter of them may stream; gevent workers aren't limited.
+    """
+    if os.environ.get("SERVER_MODE", "sync") == "async":
+        return None
+    return max(1, int(os.environ.get("THREADS", "16")) // 4)
+
+
+@api.before_request
+def _start_timing():
+    g.started_at = time.perf_counter()
+    g.upstream_timings = metrics.start_request_timings()
+    g.stale_providers = cache.start_stale_tracking()
+
+
+@api.after_request
+def _record_timing(response):
+    """Record route latency and report it in a Server-Timing header."""
+    elapsed = time.perf_counter() - g.started_at
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.route_latency.observe(elapsed, route=route, method=request.method, status=response.status_code)
+
+    timings = [f"app;dur={elapsed * 1000:.1f}"]
+    for provider, seconds in sorted(g.upstream_timings.items()):
+        timings.append(f"{provider};dur={seconds * 1000:.1f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+
+def _success(data, **extra):
+    """Build a success response, flagged `stale` if any upstream was answered from last-known-good data."""
+    body = {"success": True, "data": data, **extra}
+    if g.stale_providers:
+        body["stale"] = True
+        body["stale_providers"] = sorted(g.stale_providers)
+    return jsonify(body)
+
+
+def _annotating():
+    return request.args.get("annotate") in ("1", "true")
+
+
+def _items_success(items, **extra):
+    """Build a success response for media records.
+
+    With `?annotate=1` each item carries its library status, progress and
+    *arr URL under `library`, so the client doesn't need the library maps.
+    """
+    if _annotating():
+        items, errors = annotate.annotate(items)
+        if errors:
+            extra["library_errors"] = errors
+    else:
+        items = models.to_dicts(items)
+    return _success(items, **extra)
+
+
+def _error_response(e):
+    """Turn an exception into a JSON error with a status code that says where it came from."""
+    if isinstance(e, CircuitOpenError):
+        status = 503
+    elif isinstance(e, (requests.Timeout, TimeoutError)):
+        status = 504
+    elif isinstance(e, requests.RequestException):
+        status = 502
+    else:
+        status = 500
+
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.route_errors.inc(route=route, error=type(e).__name__)
+    return jsonify({"success": False, "error": str(e)}), status
+
+
+def _catalogue_page(kind):
+    """Serve one cursor page of the trending catalogue.
+
+    Providers whose next page failed are listed under `provider_errors`;
+    that page is asked for again on the next request.
+    """
+    limit = min(request.args.get("limit", get_catalogue_config().get("page_size", 50), type=int), 100)
+    try:
+        cursor = catalogue.parse_cursor(request.args.get("cursor", "0"))
+    except ValueError:
+        cursor = None
+    if cursor is None or limit < 1:
+        return jsonify({"success": False, "error": "Invalid cursor or limit"}), 400
 
-def merge_movies(tmdb_movies, trakt_movies, limit=50):
-    """Merge and deduplicate movies from TMDB and Trakt."""
-    seen_ids = set()
-    merged = []
-
-    # Add TMDB movies first (better poster data)
-    for movie in tmdb_movies:
-        tmdb_id = movie.get("tmdb_id")
-        if tmdb_id and tmdb_id not in seen_ids:
-            seen_ids.add(tmdb_id)
-            merged.append(movie)
-
-    # Add Trakt movies that aren't already in the list
-    for movie in trakt_movies:
-        tmdb_id = movie.get("tmdb_id")
-        if tmdb_id and tmdb_id not in seen_ids:
-            seen_ids.add(tmdb_id)
-            merged.append(movie)
-
-    return merged[:limit]
-
-
-def merge_shows(tmdb_shows, trakt_shows, limit=50):
-    """Merge and deduplicate shows from TMDB and Trakt."""
-    seen_ids = set()
-    merged = []
-
-    # Add TMDB shows first (better poster data)
-    for show in tmdb_shows:
-        tmdb_id = show.get("tmdb_id")
-        if tmdb_id and tmdb_id not in seen_ids:
-            seen_ids.add(tmdb_id)
-            merged.append(show)
-
-    # Add Trakt shows that aren't already in the list
-    for show in trakt_shows:
-        tmdb_id = show.get("tmdb_id")
-        if tmdb_id and tmdb_id not in seen_ids:
-            seen_ids.add(tmdb_id)
-            merged.append(show)
-
-    return merged[:limit]
+    try:
+        items, next_cursor, errors = catalogue.get_catalogue(kind).page(cursor, limit)
+        extra = {"provider_errors": errors} if errors else {}
+        return _items_success(items, next_cursor=next_cursor, **extra)
+    except Exception as e:
+        return _error_response(e)
 
 
 @api.route("/movies")
 def get_movies():
-    """Get top 50 trending/new movies."""
-    try:
-        # Get 3 pages from TMDB (60 items) to ensure we have enough with posters
-        tmdb_movies = tmdb.get_trending_movies(page=1)
-        tmdb_movies += tmdb.get_trending_movies(page=2)
-        tmdb_movies += tmdb.get_trending_movies(page=3)
-        trakt_movies = trakt.get_trending_movies(limit=50)
-
-        # Merge and deduplicate (TMDB first for posters)
-        merged = merge_movies(tmdb_movies, trakt_movies, limit=50)
-
-        return jsonify({"success": True, "data": merged})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+    """Get a page of trending movies; pass `next_cursor` back as `cursor` for the next one."""
+    return _catalogue_page("movies")
 
 
 @api.route("/shows")
 def get_shows():
-    """Get top 50 trending/new TV shows."""
-    try:
-        # Get 3 pages from TMDB (60 items) to ensure we have enough with posters
-        tmdb_shows = tmdb.get_trending_shows(page=1)
-        tmdb_shows += tmdb.get_trending_shows(page=2)
-        tmdb_shows += tmdb.get_trending_shows(page=3)
-        trakt_shows = trakt.get_trending_shows(limit=50)
+    """Get a page of trending TV shows; pass `next_cursor` back as `cursor` for the next one."""
+    return _catalogue_page("shows")
 
-        # Merge and deduplicate (TMDB first for posters)
-        merged = merge_shows(tmdb_shows, trakt_shows, limit=50)
 
-        return jsonify({"success": True, "data": merged})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+def _local_search(query, media_type):
+    """Get local results that can answer a search without TMDB, or None.
 
+    Only title matches count: overviews are indexed too, so a common word
+    would otherwise match enough titles to skip TMDB.
+    """
+    min_local = get_search_config().get("min_local_results", 20)
+    if min_local <= 0:
+        return None
+    local = search_index.search(query, media_type, limit=min_local, titles_only=True)
+    return local if len(local) >= min_local else None
 
-@api.route("/search/movies")
-def search_movies():
-    """Search for movies by title."""
+
+def _search(media_type, search_upstream):
+    """Answer a search from the local index, falling back to TMDB."""
     query = request.args.get("query", "")
     if not query:
         return jsonify({"success": False, "error": "Query parameter required"}), 400
 
+    local = _local_search(query, media_type)
+    if local is not None:
+        return _items_success(local)
+
     try:
-        results = tmdb.search_movies(query)
-        return jsonify({"success": True, "data": results})
+        results = search_upstream(query)
+        return _items_success(results)
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        # Overview matches are better than nothing while TMDB is down
+        local = search_index.search(query, media_type)
+        if local:
+            return _items_success(local)
+        return _error_response(e)
+
+
+@api.route("/search/movies")
+def search_movies():
+    """Search for movies by title."""
+    return _search("movie", tmdb.search_movies)
 
 
 @api.route("/search/shows")
 def search_shows():
     """Search for TV shows by title."""
-    query = request.args.get("query", "")
-    if not query:
-        return jsonify({"success": False, "error": "Query parameter required"}), 400
+    return _search("tv", tmdb.search_shows)
+
+
+def _typeahead_register(client, seq):
+    """Record a client's latest type-ahead query; older sequence numbers are superseded."""
+    with _typeahead_lock:
+        if seq > _typeahead_seqs.get(client, -1):
+            _typeahead_seqs[client] = seq
+        _typeahead_seqs.move_to_end(client)
+        while len(_typeahead_seqs) > TYPEAHEAD_CLIENTS:
+            _typeahead_seqs.popitem(last=False)
+
+
+def _typeahead_superseded(client, seq):
+    with _typeahead_lock:
+        return _typeahead_seqs.get(client, seq) > seq
+
+
+@api.route("/search/typeahead")
+def search_typeahead():
+    """Search as the user types.
+
+    Answers from the local index or from a cached, complete result for a
+    shorter prefix when possible. A query superseded by a newer `seq` from
+    the same `client` is dropped before it reaches TMDB.
+    """
+    query = " ".join(request.args.get("query", "").lower().split())
+    media_type = request.args.get("type", "movie")
+    if media_type not in ("movie", "tv"):
+        return jsonify({"success": False, "error": "type must be movie or tv"}), 400
+    client = request.args.get("client", "")
+    seq = request.args.get("seq", 0, type=int)
+
+    if len(query) < TYPEAHEAD_MIN_LENGTH:
+        return _success([], seq=seq, source="none")
+
+    if client:
+        _typeahead_register(client, seq)
+
+    local = _local_search(query, media_type)
+    if local is not None:
+        return _items_success(local, seq=seq, source="local")
+
+    narrowed = tmdb.narrow_search(media_type, query)
+    if narrowed is not None:
+        return _items_success(narrowed, seq=seq, source="prefix")
+
+    if client and _typeahead_superseded(client, seq):
+        return _success([], seq=seq, source="none", superseded=True)
 
     try:
-        results = tmdb.search_shows(query)
-        return jsonify({"success": True, "data": results})
+        search_upstream = tmdb.search_movies if media_type == "movie" else tmdb.search_shows
+        return _items_success(search_upstream(query), seq=seq, source="tmdb")
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        local = search_index.search(query, media_type)
+        if local:
+            return _items_success(local, seq=seq, source="local")
+        return _error_response(e)
+
+
+def _library_status(name, service, since=None):
+    """Read a service's library snapshot, with its age in seconds."""
+    library_poller = poller.get_poller(name)
+    snapshot = poller.get_snapshot(name, service)
+
+    status = snapshot.delta(since) if since else snapshot.full()
+    status["age"] = round(time.time() - snapshot.updated_at, 1)
+    if library_poller is not None:
+        if library_poller.last_error:
+            status["error"] = library_poller.last_error
+        if library_poller.stale:
+            status["stale"] = True
+    return status
 
 
 @api.route("/radarr/library")
 def get_radarr_library():
-    """Get TMDB IDs of movies in Radarr with status."""
+    """Get TMDB IDs of movies in Radarr with status.
+
+    Pass `?since=<version>` to only get entries changed since that version.
+    """
     try:
-        status = radarr.get_library_with_status()
-        return jsonify({"success": True, "data": status})
+        status = _library_status("radarr", radarr, request.args.get("since"))
+        return _success(status)
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        return _error_response(e)
 
 
 @api.route("/sonarr/library")
 def get_sonarr_library():
-    """Get TVDB and TMDB IDs of shows in Sonarr with status."""
+    """Get TVDB and TMDB IDs of shows in Sonarr with status.
+
+    Pass `?since=<version>` to only get entries changed since that version.
+    """
     try:
-        status = sonarr.get_library_with_status()
-        return jsonify({"success": True, "data": status})
+        status = _library_status("sonarr", sonarr, request.args.get("since"))
+        return _success(status)
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        return _error_response(e)
+
+
+@api.route("/library/status", methods=["POST"])
+def get_library_status():
+    """Get the library status of specific items.
+
+    Expects `{"type": "movie" | "tv", "items": [{"tmdb_id", "tvdb_id"}]}`;
+    returns one status (or null) per item, in order, as in `?annotate=1`.
+    """
+    data = request.get_json(silent=True) or {}
+    media_type = data.get("type")
+    items = data.get("items")
+    if media_type not in ("movie", "tv") or not isinstance(items, list):
+        return jsonify({"success": False, "error": "type (movie or tv) and items required"}), 400
+    if len(items) > MAX_STATUS_ITEMS:
+        return jsonify({"success": False, "error": f"At most {MAX_STATUS_ITEMS} items"}), 400
+
+    # Anything but an int or string can't be an id, and can't be looked up
+    items = [
+        {key: value for key, value in item.items() if isinstance(value, (int, str))} if isinstance(item, dict) else {}
+        for item in items
+    ]
+    states, errors = annotate.annotate_ids(media_type, items)
+    if errors:
+        return _success(states, library_errors=errors)
+    return _success(states)
+
+
+@api.route("/events")
+def stream_events():
+    """Stream library changes (including download progress) as Server-Sent Events.
+
+    Every connected client reads from the same broadcaster, which is fed by
+    the background pollers, so open dashboards add no upstream polling.
+    Connections are closed after a while and the browser reconnects. Past
+    `_max_event_streams()` open streams the answer is a 503, and the client
+    falls back to its periodic status checks.
+    """
+    global _event_streams
+    limit = _max_event_streams()
+    with _event_streams_lock:
+        if limit is not None and _event_streams >= limit:
+            response = jsonify({"success": False, "error": "Too many open event streams"})
+            response.status_code = 503
+            response.headers["Retry-After"] = str(EVENT_STREAM_MAX_AGE)
+            return response
+        _event_streams += 1
+
+    def closed():
+        global _event_streams
+        with _event_streams_lock:
+            _event_streams -= 1
+
+    last_seen = request.headers.get("Last-Event-ID", type=int)
+    if last_seen is None or last_seen > events.broadcaster.latest:
+        last_seen = events.broadcaster.latest
+
+    def generate(last_seen):
+        yield "retry: 5000\n\n"
+        closes_at = time.time() + EVENT_STREAM_MAX_AGE
+        while time.time() < closes_at:
+            new_events = events.broadcaster.wait(last_seen, timeout=EVENT_STREAM_HEARTBEAT)
+            if not new_events:
+                yield ": keepalive\n\n"
+                continue
+            for seq, kind, data in new_events:
+                last_seen = seq
+                yield f"id: {seq}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+    response = Response(
+        generate(last_seen),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.call_on_close(closed)
+    return response
 
 
 @api.route("/radarr/profiles")
@@ -138,9 +360,9 @@ def get_radarr_profiles():
     """Get Radarr quality profiles."""
     try:
         profiles = radarr.get_quality_profiles()
-        return jsonify({"success": True, "data": profiles})
+        return _success(profiles)
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        return _error_response(e)
 
 
 @api.route("/sonarr/profiles")
@@ -148,14 +370,18 @@ def get_sonarr_profiles():
     """Get Sonarr quality profiles."""
     try:
         profiles = sonarr.get_quality_profiles()
-        return jsonify({"success": True, "data": profiles})
+        return _success(profiles)
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        return _error_response(e)
 
 
 @api.route("/radarr/add", methods=["POST"])
 def add_to_radarr():
-    """Add a movie to Radarr."""
+    """Add a movie to Radarr; pass `instance` to choose the instance instead of the add rules.
+
+    Pass `profile_instance` with the instance `quality_profile_id` came from;
+    a profile that doesn't belong to the chosen instance is a 400.
+    """
     data = request.get_json()
     tmdb_id = data.get("tmdb_id")
     quality_profile_id = data.get("quality_profile_id")
@@ -166,15 +392,26 @@ def add_to_radarr():
         return jsonify({"success": False, "error": "quality_profile_id required"}), 400
 
     try:
-        result = radarr.add_movie(tmdb_id, quality_profile_id)
-        return jsonify({"success": True, "data": result})
+        result = radarr.add_movie(
+            tmdb_id,
+            quality_profile_id,
+            instance=data.get("instance"),
+            profile_instance=data.get("profile_instance"),
+        )
+        poller.refresh("radarr")
+        return _success(result)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        return _error_response(e)
 
 
 @api.route("/sonarr/add", methods=["POST"])
 def add_to_sonarr():
-    """Add a TV show to Sonarr."""
+    """Add a TV show to Sonarr; pass `instance` to choose the instance instead of the add rules.
+
+    `profile_instance` works as for /api/radarr/add.
+    """
     data = request.get_json()
     tvdb_id = data.get("tvdb_id")
     tmdb_id = data.get("tmdb_id")
@@ -189,11 +426,194 @@ def add_to_sonarr():
         result = sonarr.add_series(
             tvdb_id=tvdb_id,
             tmdb_id=tmdb_id,
-            quality_profile_id=quality_profile_id
+            quality_profile_id=quality_profile_id,
+            instance=data.get("instance"),
+            profile_instance=data.get("profile_instance"),
         )
-        return jsonify({"success": True, "data": result})
+        poller.refresh("sonarr")
+        return _success(result)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
+        return _error_response(e)
+
+
+@api.route("/radarr/lookup/prefetch", methods=["POST"])
+def prefetch_radarr_lookup():
+    """Warm the cached Radarr lookup for a movie, so adding it is a single POST."""
+    tmdb_id = (request.get_json() or {}).get("tmdb_id")
+    if not tmdb_id:
+        return jsonify({"success": False, "error": "tmdb_id required"}), 400
+
+    fanout.submit("radarr", radarr.lookup_movie, tmdb_id)
+    return jsonify({"success": True}), 202
+
+
+@api.route("/sonarr/lookup/prefetch", methods=["POST"])
+def prefetch_sonarr_lookup():
+    """Warm the cached Sonarr lookup for a show, so adding it is a single POST."""
+    data = request.get_json() or {}
+    tvdb_id = data.get("tvdb_id")
+    tmdb_id = data.get("tmdb_id")
+    if not tvdb_id and not tmdb_id:
+        return jsonify({"success": False, "error": "tvdb_id or tmdb_id required"}), 400
+
+    # Same lookup add_series will make
+    if tvdb_id:
+        fanout.submit("sonarr", sonarr.lookup_series, tvdb_id)
+    else:
+        fanout.submit("sonarr", sonarr.lookup_series_by_tmdb, tmdb_id)
+    return jsonify({"success": True}), 202
+
+
+def _is_id(value):
+    # JSON true/false decode to bools, which are ints too
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _bulk_items(name, data):
+    """Get the items to add from `items`, `tmdb_ids` and (for Sonarr) `tvdb_ids`, or None if malformed."""
+    id_types = ("tmdb", "tvdb") if name == "sonarr" else ("tmdb",)
+    items = data.get("items", [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return None
+    if not all(item.get(f"{t}_id") is None or _is_id(item[f"{t}_id"]) for item in items for t in id_types):
+        return None
+    for t in id_types:
+        ids = data.get(f"{t}_ids", [])
+        if not isinstance(ids, list) or not all(_is_id(item_id) for item_id in ids):
+            return None
+        items = items + [{f"{t}_id": item_id} for item_id in ids]
+    return items
+
+
+def _bulk_add(name):
+    """Add a list of titles; large batches run as a background job."""
+    data = request.get_json(silent=True) or {}
+    items = _bulk_items(name, data)
+    quality_profile_id = data.get("quality_profile_id")
+
+    if not items:
+        ids = "tmdb_ids or tvdb_ids" if name == "sonarr" else "tmdb_ids"
+        return jsonify({"success": False, "error": f"items or {ids} required, as lists with integer ids"}), 400
+    if not quality_profile_id:
+        return jsonify({"success": False, "error": "quality_profile_id required"}), 400
+
+    config = get_bulk_config()
+    if len(items) > config.get("max_items", 1000):
+        return jsonify({"success": False, "error": f"At most {config.get('max_items', 1000)} items per request"}), 400
+
+    try:
+        if data.get("background") or len(items) > config.get("background_threshold", 20):
+            job = bulk.start_job(name, items, quality_profile_id, data.get("instance"), data.get("profile_instance"))
+            response = jsonify({"success": True, "job": job})
+            response.status_code = 202
+            response.headers["Location"] = f"/api/jobs/{job['id']}"
+            return response
+
+        results = bulk.add_many(
+            name, items, quality_profile_id, instance=data.get("instance"), profile_instance=data.get("profile_instance")
+        )
+        return _success(results, summary=bulk.summarize(results))
+    except Exception as e:
+        return _error_response(e)
+
+
+@api.route("/radarr/add/bulk", methods=["POST"])
+def bulk_add_to_radarr():
+    """Add many movies to Radarr, skipping ones already in the library."""
+    return _bulk_add("radarr")
+
+
+@api.route("/sonarr/add/bulk", methods=["POST"])
+def bulk_add_to_sonarr():
+    """Add many TV shows to Sonarr, skipping ones already in the library."""
+    return _bulk_add("sonarr")
+
+
+@api.route("/jobs/<job_id>")
+def get_job(job_id):
+    """Get the progress and results of a background job."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return _success(job)
+
+
+def _plex_url():
+    return get_plex_config().get("url", "https://app.plex.tv/desktop")
+
+
+def _compress(response):
+    """Gzip a response body if the client accepts it."""
+    if "gzip" not in request.accept_encodings or response.status_code != 200:
+        return response
+    response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def _bootstrap_etag(payload):
+    """Hash the bootstrap payload, ignoring fields that change on every call."""
+    stable = {
+        key: {k: v for k, v in value.items() if k not in ("age", "version")} if key.endswith("_library") else value
+        for key, value in payload["data"].items()
+    }
+    body = json.dumps([stable, payload["errors"]], sort_keys=True)
+    return hashlib.sha1(body.encode()).hexdigest()
+
+
+@api.route("/bootstrap")
+def get_bootstrap():
+    """Get everything the dashboard needs on startup in one response.
+
+    Libraries, profiles, the Plex URL and the first catalogue page are built
+    concurrently. Sections that fail are listed under `errors` instead of
+    failing the whole response. Supports ETag/If-None-Match.
+
+    With `?annotate=1` the library maps are left out and the catalogue page
+    is annotated with library status instead.
+    """
+    tab = request.args.get("tab", "movies")
+    if tab not in ("movies", "shows"):
+        return jsonify({"success": False, "error": "tab must be movies or shows"}), 400
+    futures = {
+        "radarr_profiles": fanout.submit("radarr", radarr.get_quality_profiles),
+        "sonarr_profiles": fanout.submit("sonarr", sonarr.get_quality_profiles),
+    }
+    if not _annotating():
+        futures["radarr_library"] = fanout.submit("radarr", _library_status, "radarr", radarr)
+        futures["sonarr_library"] = fanout.submit("sonarr", _library_status, "sonarr", sonarr)
+
+    data = {"plex_url": _plex_url()}
+    errors = {}
+    # The catalogue fans out itself, so build it on this thread
+    try:
+        page_size = get_catalogue_config().get("page_size", 50)
+        data[tab], data["next_cursor"], provider_errors = catalogue.get_catalogue(tab).page(catalogue.START, page_size)
+        errors.update({f"{tab}_{provider}": error for provider, error in provider_errors.items()})
+        if _annotating():
+            data[tab], library_errors = annotate.annotate(data[tab])
+            errors.update({f"{name}_library": error for name, error in library_errors.items()})
+        else:
+            data[tab] = models.to_dicts(data[tab])
+    except Exception as e:
+        errors[tab] = str(e)
+
+    results, failures = fanout.gather(futures)
+    data.update(results)
+    errors.update({key: str(e) for key, e in failures.items()})
+
+    payload = {"success": True, "data": data, "errors": errors}
+    if g.stale_providers:
+        payload["stale"] = True
+        payload["stale_providers"] = sorted(g.stale_providers)
+    response = jsonify(payload)
+    response.set_etag(_bootstrap_etag(payload), weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    response.make_conditional(request)
+    return _compress(response)
 
 
 @api.route("/status")
@@ -206,14 +626,26 @@ def get_status():
         "success": True,
         "radarr": radarr_status,
         "sonarr": sonarr_status,
+        "circuits": upstream.breaker_status(),
     })
 
 
 @api.route("/plex/config")
 def get_plex_url():
     """Get Plex URL for watch links."""
-    config = get_plex_config()
     return jsonify({
         "success": True,
-        "url": config.get("url", "https://app.plex.tv/desktop"),
+        "url": _plex_url(),
     })
+
+
+@api.route("/cache/stats")
+def get_cache_stats():
+    """Get response cache hit/miss counters."""
+    return _success(cache.stats())
+
+
+@api.route("/metrics")
+def get_metrics():
+    """Get upstream, cache and route metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,40 @@
+import mimetypes
+import re
+import requests
+from flask import Blueprint, abort, send_file
+from app.services import images as image_cache
+from app.services.breaker import CircuitOpenError
+
+images = Blueprint("images", __name__, url_prefix="/img")
+
+IMMUTABLE_MAX_AGE = 31536000  # One year; a URL always names the same bytes
+# Raster formats only: an SVG served from our origin could run script
+_FILENAME = re.compile(r"^[A-Za-z0-9_-]+\.(jpg|jpeg|png|webp)$")
+
+
+@images.route("/<size>/<filename>")
+def get_image(size, filename):
+    """Serve a TMDB image at one of its size variants from the local disk cache."""
+    if size not in image_cache.allowed_sizes() or not _FILENAME.match(filename):
+        abort(404)
+
+    try:
+        f, key = image_cache.get_cache().open_image(size, filename)
+    except CircuitOpenError:
+        abort(503)
+    except requests.HTTPError as e:
+        abort(404 if e.response is not None and e.response.status_code == 404 else 502)
+    except requests.RequestException:
+        abort(502)
+
+    response = send_file(
+        f,
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        etag=key,
+        max_age=IMMUTABLE_MAX_AGE,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    # The bytes come from upstream; don't let a browser sniff them as anything else
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
@@ -0,0 +1,41 @@
+import hmac
+from flask import Blueprint, abort, jsonify, request
+from app.config import get_webhooks_config
+from app.services import webhooks as webhook_service
+
+webhooks = Blueprint("webhooks", __name__, url_prefix="/api/webhooks")
+
+
+def _token():
+    """The token a request carries: `?token=`, an X-Webhook-Token header, or the Basic auth password."""
+    if request.args.get("token"):
+        return request.args["token"]
+    if request.headers.get("X-Webhook-Token"):
+        return request.headers["X-Webhook-Token"]
+    if request.authorization is not None:
+        return request.authorization.password or ""
+    return ""
+
+
+@webhooks.route("/<service>", methods=["POST"])
+def receive(service):
+    """Receive a Radarr/Sonarr Connect webhook and apply it to the library status.
+
+    Set the webhook URL in Radarr/Sonarr to `/api/webhooks/radarr` or
+    `/api/webhooks/sonarr`, adding `?instance=<name>` when several instances
+    are configured.
+    """
+    if service not in webhook_service.SERVICES or not webhook_service.enabled():
+        abort(404)
+    if not hmac.compare_digest(_token().encode(), get_webhooks_config()["token"].encode()):
+        return jsonify({"success": False, "error": "Invalid webhook token"}), 401
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not payload.get("eventType"):
+        return jsonify({"success": False, "error": "Expected a Connect webhook payload"}), 400
+
+    try:
+        event = webhook_service.receive(service, request.args.get("instance"), payload)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "event": event["type"]})
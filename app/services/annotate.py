@@ -0,0 +1,61 @@
+from app.services import poller, radarr, sonarr
+from app.services.library import status_keys
+
+SERVICES = {"movie": ("radarr", radarr), "tv": ("sonarr", sonarr)}
+
+
+def library_state(snapshot, media_type, tmdb_id, tvdb_id=None):
+    """Get an item's library status, progress and *arr URL, or None if it isn't in the library."""
+    found = snapshot.find(status_keys(media_type, tmdb_id, tvdb_id))
+    if found is None:
+        return None
+    key, entry = found
+    state = {
+        "status": key[0],
+        "progress": 100 if key[0] == "downloaded" else entry.get("progress", 0),
+        "arr_url": entry.get("radarr_url") or entry.get("sonarr_url"),
+    }
+    for field in ("has_episodes", "instance"):
+        if field in entry:
+            state[field] = entry[field]
+    return state
+
+
+def _snapshots(media_types):
+    """Get `(snapshots, errors)` for the services behind `media_types`.
+
+    A service that can't be refreshed is annotated from whatever its
+    snapshot last held, and its error is reported.
+    """
+    snapshots = {}
+    errors = {}
+    for media_type in media_types:
+        name, service = SERVICES[media_type]
+        try:
+            snapshots[media_type] = poller.get_snapshot(name, service)
+        except Exception as e:
+            snapshots[media_type] = service.library_snapshot
+            errors[name] = str(e)
+    return snapshots, errors
+
+
+def annotate(records):
+    """Get `(items, errors)`: records as dicts, each with its `library` state.
+
+    The join runs against the in-memory library snapshots, so clients don't
+    need the full status maps to draw a card.
+    """
+    snapshots, errors = _snapshots({record.media_type for record in records})
+    items = []
+    for record in records:
+        item = record.to_dict()
+        item["library"] = library_state(snapshots[record.media_type], record.media_type, record.tmdb_id, record.tvdb_id)
+        items.append(item)
+    return items, errors
+
+
+def annotate_ids(media_type, items):
+    """Get `(states, errors)` for `{tmdb_id, tvdb_id}` dicts, in order."""
+    snapshots, errors = _snapshots({media_type})
+    snapshot = snapshots[media_type]
+    return [library_state(snapshot, media_type, item.get("tmdb_id"), item.get("tvdb_id")) for item in items], errors
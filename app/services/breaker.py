@@ -0,0 +1,69 @@
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after repeated failures.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail fast for `reset_timeout` seconds. Then up to `half_open_max`
+    probe calls are let through: one success closes the circuit again, a
+    failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, half_open_max=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probes = 0
+        self._probe_started = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call should not be made."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                # A probe that never reported back must not wedge the circuit
+                if time.time() - self._probe_started >= self.reset_timeout:
+                    self._probes = 0
+                if self._probes >= self.half_open_max:
+                    raise CircuitOpenError(f"{self.name} is unavailable (recovery probe in progress)")
+                self._probes += 1
+                self._probe_started = time.time()
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Count a failure; returns True if this opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.time()
+                return True
+            return False
+
+    def status(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
@@ -0,0 +1,115 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+from app.config import get_bulk_config
+from app.services import fanout, jobs, poller, radarr, sonarr
+
+# Ids each service accepts for an item, in lookup order
+ID_TYPES = {
+    "radarr": ("tmdb",),
+    "sonarr": ("tvdb", "tmdb"),
+}
+SERVICES = {"radarr": radarr, "sonarr": sonarr}
+
+
+def _library_ids(name):
+    """Ids already in a service's library, by id type, from the cached library."""
+    if name == "radarr":
+        return {"tmdb": radarr.get_library_tmdb_ids()}
+    return {"tvdb": sonarr.get_library_tvdb_ids(), "tmdb": sonarr.get_library_tmdb_ids()}
+
+
+def _add(name, ids, quality_profile_id, instance=None, profile_instance=None):
+    if name == "radarr":
+        return radarr.add_movie(
+            ids["tmdb_id"], quality_profile_id, instance=instance, profile_instance=profile_instance, invalidate=False
+        )
+    return sonarr.add_series(
+        quality_profile_id=quality_profile_id, instance=instance, profile_instance=profile_instance, invalidate=False, **ids
+    )
+
+
+def _plan(name, items):
+    """Get `(reports, to_add)`: reports for items that are skipped, and `(index, ids)` to add."""
+    library = _library_ids(name)
+    reports = {}
+    to_add = []
+    seen = set()
+    for index, item in enumerate(items):
+        ids = {f"{t}_id": item.get(f"{t}_id") for t in ID_TYPES[name] if item.get(f"{t}_id")}
+        if not ids:
+            reports[index] = {"status": "invalid", "error": f"{' or '.join(ID_TYPES[name])} id required"}
+        elif any(value in library[key.removesuffix("_id")] for key, value in ids.items()):
+            reports[index] = {**ids, "status": "exists"}
+        elif any((key, value) in seen for key, value in ids.items()):
+            reports[index] = {**ids, "status": "duplicate"}
+        else:
+            seen.update(ids.items())
+            to_add.append((index, ids))
+    return reports, to_add
+
+
+def summarize(results):
+    """Count results by status."""
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary
+
+
+def add_many(name, items, quality_profile_id, job=None, instance=None, profile_instance=None):
+    """Add many titles to Radarr or Sonarr; returns a report per item, in order.
+
+    Titles already in the library (or repeated in `items`) are skipped. The
+    rest are looked up and added concurrently, at most `bulk.concurrency` at
+    a time, so a large batch never ties up the whole fan-out pool. With a
+    `job`, its progress and results are saved after every item; the cached
+    library is dropped once, when the batch is done. Without an
+    `instance`, each title goes where the instances' add rules send it;
+    `profile_instance` is passed on as in `radarr.add_movie`.
+    """
+    reports, to_add = _plan(name, items)
+    concurrency = get_bulk_config().get("concurrency", 4)
+
+    def ordered():
+        return [reports[i] for i in sorted(reports)]
+
+    def progress():
+        if job is not None:
+            job["done"] = len(reports)
+            job["results"] = ordered()
+            job["summary"] = summarize(job["results"])
+            jobs.save(job)
+
+    progress()
+    pending = {}
+    queue = iter(to_add)
+    while True:
+        for index, ids in queue:
+            pending[fanout.submit(name, _add, name, ids, quality_profile_id, instance, profile_instance)] = (index, ids)
+            if len(pending) >= concurrency:
+                break
+        if not pending:
+            break
+
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            index, ids = pending.pop(future)
+            try:
+                result = future.result() or {}
+                reports[index] = {**ids, "status": "added", "title": result.get("title")}
+            except Exception as e:
+                reports[index] = {**ids, "status": "failed", "error": str(e)}
+        progress()
+
+    if to_add:
+        SERVICES[name].library.invalidate()
+        poller.refresh(name)
+    return ordered()
+
+
+def start_job(name, items, quality_profile_id, instance=None, profile_instance=None):
+    """Run `add_many` as a background job; returns the job."""
+    return jobs.start(
+        f"{name}_bulk_add",
+        len(items),
+        lambda job: add_many(name, items, quality_profile_id, job=job, instance=instance, profile_instance=profile_instance),
+    )
@@ -0,0 +1,316 @@
+import contextvars
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from app.config import get_cache_config
+from app.services import fanout, metrics, singleflight, sqlite
+
+DEFAULT_TTLS = {
+    "trending": 3600,
+    "lists": 3600,
+    "search": 600,
+    "details": 86400,
+    "library": 10,
+    "metadata": 86400,
+    "lookup": 86400,
+}
+
+# Endpoint classes whose expired entries may still be served while refreshing
+REVALIDATE_CLASSES = {"trending", "lists", "search", "details", "metadata", "lookup"}
+
+FINGERPRINT_TTL = 365 * 86400
+
+
+class MemoryBackend:
+    """Per-process LRU cache.
+
+    Backends keep an entry until `ttl + keep_for` seconds have passed and
+    return it with its expiry time; deciding whether an expired entry may
+    still be served is left to `get_or_fetch`.
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return `(value, expires_at)` for a kept entry, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, stale_until = entry
+            if now >= stale_until:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value, expires_at
+
+    def set(self, key, value, ttl, keep_for=0):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, now + ttl, now + ttl + keep_for)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend(sqlite.SQLiteFile):
+    """Cache shared by every worker process on the host via a SQLite file.
+
+    Values are stored as JSON. Each write is a single INSERT OR REPLACE, so
+    readers in other processes see either the old or the new entry. Once the
+    table grows past `max_entries`, the entries closest to expiry are evicted.
+    """
+
+    PURGE_EVERY = 256
+
+    def __init__(self, path, max_entries=2048):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, stale_until REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_stale_until ON cache (stale_until)")
+
+    def get(self, key):
+        now = time.time()
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND stale_until > ?",
+            (key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, ttl, keep_for=0):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, stale_until) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now + ttl + keep_for),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge(conn, now)
+
+    def _purge(self, conn, now):
+        conn.execute("DELETE FROM cache WHERE stale_until <= ?", (now,))
+        conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM cache ORDER BY stale_until DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def invalidate(self, prefix):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._connect().execute(
+            "DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",)
+        )
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+
+    def size(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+# Providers that were answered from last-known-good data during the current request
+_stale_providers = contextvars.ContextVar("stale_providers", default=None)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_backend(get_cache_config())
+    return _cache
+
+
+def build_backend(config, filename="media-dashboard-cache.db"):
+    """Build a cache backend from a config section; SQLite files default to the temp dir."""
+    backend = config.get("backend", "sqlite")
+    max_entries = config.get("max_entries", 2048)
+    if backend == "memory":
+        return MemoryBackend(max_entries)
+    if backend == "sqlite":
+        return SQLiteBackend(sqlite.path(config, filename), max_entries)
+    raise ValueError(f"Unsupported cache backend: {backend}")
+
+
+def _get_ttls(ttl_class):
+    """Get `(ttl, stale_ttl, keep_for)` for an endpoint class.
+
+    Entries are kept for `keep_for` seconds past their TTL so they can be
+    served as last-known-good data when the upstream is failing.
+    """
+    config = get_cache_config()
+    ttl = config.get("ttl", {}).get(ttl_class, DEFAULT_TTLS.get(ttl_class, 300))
+    stale_ttl = 0
+    if ttl_class in REVALIDATE_CLASSES:
+        stale_ttl = config.get("stale_while_revalidate", 3600)
+    keep_for = max(stale_ttl, config.get("last_known_good", 604800))
+    return ttl, stale_ttl, keep_for
+
+
+def make_key(provider, endpoint, params=None):
+    """Build a cache key from a provider endpoint and its parameters."""
+    if not params:
+        return f"{provider}:{endpoint}"
+    return f"{provider}:{endpoint}?{urlencode(sorted(params.items()))}"
+
+
+def _refresh(key, ttl_class, fetch):
+    try:
+        ttl, _, keep_for = _get_ttls(ttl_class)
+        _get_cache().set(key, fetch(), ttl, keep_for)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def _refresh_in_background(provider, key, ttl_class, fetch):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    fanout.submit(provider, _refresh, key, ttl_class, fetch)
+
+
+def get_or_fetch(provider, key, ttl_class, fetch):
+    """Return a cached response, calling `fetch` on a miss.
+
+    Expired entries are still served for the stale-while-revalidate window
+    while a background refresh replaces them. Concurrent misses for the same
+    key share a single call to `fetch`. If `fetch` fails and an older
+    entry is still kept, that last-known-good value is returned instead and
+    the provider is marked stale for the current request.
+    """
+    cache = _get_cache()
+    ttl, stale_ttl, keep_for = _get_ttls(ttl_class)
+    cached = cache.get(key)
+    if cached is not None:
+        value, expires_at = cached
+        now = time.time()
+        if now < expires_at:
+            metrics.cache_requests.inc(provider=provider, result="hit")
+            return value
+        if now < expires_at + stale_ttl:
+            metrics.cache_requests.inc(provider=provider, result="stale")
+            _refresh_in_background(provider, key, ttl_class, fetch)
+            return value
+
+    def fetch_and_store():
+        value = fetch()
+        cache.set(key, value, ttl, keep_for)
+        return value
+
+    try:
+        value, shared = singleflight.do(key, fetch_and_store)
+    except Exception:
+        _count_miss(provider)
+        if cached is None:
+            raise
+        metrics.cache_requests.inc(provider=provider, result="last_known_good")
+        _mark_stale(provider)
+        return cached[0]
+
+    _count_miss(provider, shared)
+    return value
+
+
+def _count_miss(provider, shared=False):
+    """Count a miss; `shared` misses waited on another caller's fetch."""
+    if shared:
+        metrics.cache_requests.inc(provider=provider, result="coalesced")
+    else:
+        metrics.cache_requests.inc(provider=provider, result="miss")
+
+
+def peek(key, ttl_class):
+    """Return a cached response still servable for its class, without fetching."""
+    cached = _get_cache().get(key)
+    if cached is None:
+        return None
+    value, expires_at = cached
+    _, stale_ttl, _ = _get_ttls(ttl_class)
+    if time.time() >= expires_at + stale_ttl:
+        return None
+    return value
+
+
+def check_fingerprint(name, fingerprint, prefixes):
+    """Invalidate `prefixes` when `fingerprint` differs from the one last recorded as `name`.
+
+    Returns True if a recorded fingerprint changed.
+    """
+    cache = _get_cache()
+    key = f"fingerprint:{name}"
+    cached = cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return False
+    for prefix in prefixes:
+        cache.invalidate(prefix)
+    cache.set(key, fingerprint, FINGERPRINT_TTL)
+    return cached is not None
+
+
+def _mark_stale(provider):
+    providers = _stale_providers.get()
+    if providers is not None:
+        providers.add(provider)
+
+
+def start_stale_tracking():
+    """Start tracking last-known-good fallbacks for the current request."""
+    providers = set()
+    _stale_providers.set(providers)
+    return providers
+
+
+def invalidate(prefix):
+    """Drop every cached response whose key starts with `prefix`."""
+    _get_cache().invalidate(prefix)
+
+
+def stats():
+    """Get hit/miss counters for the response cache, from `metrics.cache_requests`."""
+    cache = _get_cache()
+    results = metrics.totals(metrics.cache_requests, "result")
+    return {
+        "backend": type(cache).__name__,
+        "entries": cache.size(),
+        "max_entries": cache.max_entries,
+        "in_flight": singleflight.in_flight(),
+        "hits": results.get("hit", 0),
+        "stale_hits": results.get("stale", 0),
+        "misses": results.get("miss", 0),
+        "coalesced": results.get("coalesced", 0),
+        "last_known_good": results.get("last_known_good", 0),
+    }
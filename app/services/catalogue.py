@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+from app.config import get_catalogue_config
+from app.services import enrich, fanout, singleflight, tmdb, trakt
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("tmdb", "trakt")  # Served in this order when level
+TRAKT_PAGE_SIZE = 20  # Same as a TMDB page
+
+_catalogues = {}
+_catalogues_lock = threading.Lock()
+
+
+class Catalogue:
+    """Merged, deduplicated trending catalogue for one media type.
+
+    The catalogue is a walk over provider pages in a fixed order: TMDB page
+    1, Trakt page 1, TMDB page 2, and so on, with the provider that has
+    served fewer pages going next (TMDB first on a tie). Each page keeps only
+    the items no earlier page had, and Trakt-only items get their posters
+    from TMDB before they are served. A provider whose page fails is skipped
+    for that request and asked for the same page first on the next one.
+
+    Page cursors record how many pages of each provider the client has
+    consumed, plus how far it got into a page served in part. Every worker
+    can rebuild what the client has seen from those pages, which come from
+    the shared response cache, so paging is stable across workers and failed
+    pages (see `parse_cursor`). Fetched pages are kept until they are `ttl`
+    seconds old; the pages after the one a request ends on are prefetched in
+    the background.
+    """
+
+    def __init__(self, kind, max_pages=20, ttl=600):
+        self.kind = kind
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._prefetching = False
+        self._generation = 0
+        self._reset()
+
+    def _reset(self):
+        """Call with the lock held."""
+        self._pages = {provider: {} for provider in PROVIDERS}  # Page number -> items
+        self._last = {provider: self.max_pages for provider in PROVIDERS}
+        self.built_at = time.time()
+        self._generation += 1
+
+    def _check_age(self):
+        with self._lock:
+            if time.time() - self.built_at >= self.ttl:
+                self._reset()
+
+    def _fetch_page(self, provider, page):
+        with self._lock:
+            generation = self._generation
+            if page in self._pages[provider]:
+                return self._pages[provider][page]
+        if provider == "tmdb":
+            items = getattr(tmdb, f"get_trending_{self.kind}")(page)
+        else:
+            items = getattr(trakt, f"get_trending_{self.kind}")(TRAKT_PAGE_SIZE, page)
+        with self._lock:
+            if generation == self._generation:
+                self._pages[provider][page] = items
+                if not items:
+                    self._last[provider] = min(self._last[provider], page - 1)
+        return items
+
+    def _load(self, pages):
+        """Get `(provider, page)` pairs, fetching the missing ones concurrently.
+
+        Returns `(results, errors)` keyed by pair. Callers asking for the same
+        page at the same time share one fetch.
+        """
+        results = {}
+        calls = {}
+        with self._lock:
+            for provider, page in pages:
+                if page in self._pages[provider]:
+                    results[(provider, page)] = self._pages[provider][page]
+                else:
+                    key = f"catalogue:{self.kind}:{provider}:{page}"
+                    calls[(provider, page)] = (provider, self._fetch, key, provider, page)
+        if not calls:
+            return results, {}
+        fetched, errors = fanout.fetch_all(calls)
+        results.update(fetched)
+        return results, errors
+
+    def _fetch(self, key, provider, page):
+        return singleflight.do(key, lambda: self._fetch_page(provider, page))[0]
+
+    def _next_providers(self, positions):
+        """Get the providers with pages left, in the order they are served."""
+        left = [provider for provider in PROVIDERS if positions[provider] < self._last[provider]]
+        return sorted(left, key=lambda provider: positions[provider])
+
+    def page(self, cursor, limit):
+        """Get `(items, next_cursor, errors)`; `next_cursor` is None on the last page.
+
+        `cursor` is a parsed cursor (see `parse_cursor`). `errors` maps a
+        provider to the error of a page it failed to serve on this request.
+        """
+        positions, partial, skip = cursor
+        positions = {provider: min(page, self.max_pages) for provider, page in zip(PROVIDERS, positions)}
+        self._check_age()
+
+        # Rebuild what the client has seen from the pages it consumed
+        consumed = [(provider, page) for provider in PROVIDERS for page in range(1, positions[provider] + 1)]
+        results, failed = self._load(consumed)
+        if failed:
+            raise next(iter(failed.values()))
+        seen = set()
+        for key in consumed:
+            seen.update(item.tmdb_id for item in results[key])
+
+        items = []
+        errors = {}
+        while len(items) < limit:
+            with self._lock:
+                providers = self._next_providers(positions)
+            if partial:
+                providers = [partial]
+            # The pages at the shallowest depth are fetched together, like one round
+            pages = [(candidate, positions[candidate] + 1) for candidate in providers]
+            results, failed = self._load([key for key in pages if key[1] == pages[0][1]])
+            provider = page_items = None
+            for key in pages:
+                if key not in results and key not in failed:
+                    more, more_failed = self._load([key])
+                    results.update(more)
+                    failed.update(more_failed)
+                if key in failed:
+                    errors[key[0]] = failed[key]
+                    continue
+                provider, page_items = key[0], results[key]
+                break
+            if provider is None:
+                break  # Nothing left, or every provider failed
+
+            fresh = []
+            for item in page_items:
+                if item.tmdb_id and item.tmdb_id not in seen:
+                    seen.add(item.tmdb_id)
+                    fresh.append(item)
+            taken = fresh[skip:skip + limit - len(items)]
+            items.extend(taken)
+            skip += len(taken)
+            if skip >= len(fresh):
+                skip -= len(fresh)
+                positions[provider] += 1
+                partial = None
+            else:
+                partial = provider
+
+        if errors:
+            logger.warning("Catalogue %s page failed for %s", self.kind, ", ".join(sorted(errors)))
+            if not items:
+                raise next(iter(errors.values()))
+
+        with self._lock:
+            providers = self._next_providers(positions)
+        more = partial is not None or bool(providers)
+        if skip and partial is None and providers:
+            partial = providers[0]  # Left over from an offset cursor; it goes to the next page served
+        next_cursor = None
+        if more:
+            next_cursor = format_cursor([positions[provider] for provider in PROVIDERS], partial, skip)
+            self._prefetch(positions)
+        # Trakt-only items have no poster; look them up before they are served
+        items = enrich.enrich(items)
+        return items, next_cursor, {provider: str(error) for provider, error in errors.items()}
+
+    def _prefetch(self, positions):
+        with self._lock:
+            pages = [(provider, positions[provider] + 1) for provider in self._next_providers(positions)]
+            pages = [(provider, page) for provider, page in pages if page not in self._pages[provider]]
+            if self._prefetching or not pages:
+                return
+            self._prefetching = True
+        # A plain thread, since the pages themselves fan out on the shared pool
+        threading.Thread(target=self._run_prefetch, args=(pages,), name=f"prefetch-{self.kind}", daemon=True).start()
+
+    def _run_prefetch(self, pages):
+        try:
+            self._load(pages)  # The next request that needs a failed page fetches it and reports the error
+        finally:
+            with self._lock:
+                self._prefetching = False
+
+
+START = ((0,) * len(PROVIDERS), None, 0)
+
+
+def parse_cursor(cursor):
+    """Parse a page cursor into `(pages, partial, skip)`; raises ValueError if malformed.
+
+    Cursors are `<pages>.<pages>[.<skip>.<provider>]`: the TMDB and Trakt
+    pages the client has consumed, then how many new items it was served
+    from `provider`'s next page, if it stopped partway through one. A bare
+    number is an offset from the start of the catalogue.
+    """
+    parts = cursor.split(".")
+    numbers = parts[:len(PROVIDERS) + 1]
+    if not all(part.isdigit() for part in numbers) or len(parts) not in (1, len(PROVIDERS), len(PROVIDERS) + 2):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if len(parts) == 1:
+        return START[0], None, int(parts[0])
+    partial = parts[-1] if len(parts) > len(PROVIDERS) else None
+    if partial is not None and partial not in PROVIDERS:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    skip = int(parts[len(PROVIDERS)]) if partial else 0
+    return tuple(int(part) for part in parts[:len(PROVIDERS)]), partial if skip else None, skip
+
+
+def format_cursor(pages, partial=None, skip=0):
+    """Build the cursor `parse_cursor` reads back."""
+    cursor = ".".join(str(page) for page in pages)
+    if skip:
+        cursor += f".{skip}.{partial}"
+    return cursor
+
+
+def get_catalogue(kind):
+    """Get the shared catalogue for "movies" or "shows"."""
+    with _catalogues_lock:
+        if kind not in _catalogues:
+            config = get_catalogue_config()
+            _catalogues[kind] = Catalogue(kind, max_pages=config.get("max_pages", 20), ttl=config.get("ttl", 600))
+        return _catalogues[kind]
@@ -0,0 +1,68 @@
+import threading
+from app.config import get_enrichment_config
+from app.services import cache, fanout, search_index, singleflight, tmdb
+
+FOREVER = 10 * 365 * 86400  # Posters for an id don't change often enough to expire them
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = {"max_entries": 50000, **get_enrichment_config()}
+                _store = cache.build_backend(config, "media-dashboard-artwork.db")
+    return _store
+
+
+def _cached_artwork(key):
+    cached = _get_store().get(key)
+    return cached[0] if cached is not None else None
+
+
+def _fetch_artwork(key, media_type, tmdb_id):
+    def fetch():
+        artwork = tmdb.get_artwork(media_type, tmdb_id)
+        _get_store().set(key, artwork, FOREVER)
+        return artwork
+
+    return singleflight.do(key, fetch)[0]
+
+
+def enrich(records, deadline=None):
+    """Fill in posters and missing metadata for records from TMDB details.
+
+    Only records without a poster (Trakt-only items) are looked up. Results
+    are stored by tmdb_id for good, including "no poster" answers, and the
+    lookups not stored yet run concurrently on the fan-out pool. Lookups that
+    fail or miss the deadline leave their record as it was.
+    """
+    missing = [record for record in records if record.poster is None and record.tmdb_id]
+    if not missing:
+        return records
+
+    found = {}
+    futures = {}
+    for i, record in enumerate(missing):
+        key = f"artwork:{record.media_type}:{record.tmdb_id}"
+        artwork = _cached_artwork(key)
+        if artwork is not None:
+            found[i] = artwork
+        else:
+            futures[i] = fanout.submit("tmdb", _fetch_artwork, key, record.media_type, record.tmdb_id)
+    if futures:
+        results, _ = fanout.gather(futures, deadline)
+        found.update(results)
+
+    enriched = []
+    for i, artwork in found.items():
+        record = missing[i]
+        record.poster = artwork["poster"]
+        record.overview = record.overview or artwork["overview"]
+        record.date = record.date or artwork["date"]
+        enriched.append(record)
+    search_index.add_all(enriched)
+    return records
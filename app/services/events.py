@@ -0,0 +1,42 @@
+import threading
+from collections import deque
+
+
+class Broadcaster:
+    """Fan out events to any number of waiting listeners.
+
+    Events are kept in a bounded history with increasing sequence numbers,
+    so a listener only has to remember the last sequence it has seen.
+    """
+
+    def __init__(self, history=256):
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def latest(self):
+        return self._seq
+
+    def publish(self, kind, data):
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, kind, data))
+            self._cond.notify_all()
+
+    def wait(self, after, timeout=None):
+        """Get the events published after sequence `after`.
+
+        Blocks for up to `timeout` seconds if there are none yet.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after, timeout=timeout)
+            return [event for event in self._events if event[0] > after]
+
+
+broadcaster = Broadcaster()
+
+
+def publish(kind, data):
+    """Publish an event to every connected listener."""
+    broadcaster.publish(kind, data)
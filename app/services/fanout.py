@@ -0,0 +1,107 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from app.config import get_fanout_config
+
+# Calls submitted from a pool thread go to the next pool, so a task waiting on
+# calls it submitted never waits for workers it and its siblings occupy (e.g.
+# /bootstrap's library loads fanning out to several instances). Deeper calls
+# run inline on the submitting thread.
+POOLS = ("fanout", "fanout-nested")
+
+_executors = {}
+_executor_lock = threading.Lock()
+_thread = threading.local()  # `depth`: index in POOLS of the pool a thread belongs to
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def _mark_thread(depth):
+    _thread.depth = depth
+
+
+def _get_executor(depth=0):
+    if depth not in _executors:
+        with _executor_lock:
+            if depth not in _executors:
+                config = get_fanout_config()
+                _executors[depth] = ThreadPoolExecutor(
+                    max_workers=config.get("max_workers", 16),
+                    thread_name_prefix=POOLS[depth],
+                    initializer=_mark_thread,
+                    initargs=(depth,),
+                )
+    return _executors[depth]
+
+
+def _get_limit(provider):
+    """Get the semaphore bounding concurrent calls to a provider."""
+    with _limits_lock:
+        if provider not in _limits:
+            limits = get_fanout_config().get("limits", {})
+            _limits[provider] = threading.BoundedSemaphore(limits.get(provider, 4))
+        return _limits[provider]
+
+
+def _run(provider, fn, args, kwargs):
+    with _get_limit(provider):
+        return fn(*args, **kwargs)
+
+
+def submit(provider, fn, *args, **kwargs):
+    """Run a single upstream call in the background.
+
+    The call runs in a copy of the caller's context, so per-request state
+    such as upstream timings follows it onto the pool thread.
+    """
+    context = contextvars.copy_context()
+    depth = getattr(_thread, "depth", -1) + 1
+    if depth < len(POOLS):
+        return _get_executor(depth).submit(context.run, _run, provider, fn, args, kwargs)
+
+    # Already two pools deep: run it here, outside the provider limit, since
+    # this thread's ancestors may be holding that limit while they wait for it
+    future = Future()
+    try:
+        future.set_result(context.run(fn, *args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def gather(futures, deadline=None):
+    """Wait for submitted calls and collect their results.
+
+    `futures` maps a key to a future from `submit`. Returns a
+    `(results, errors)` pair of dicts keyed the same way; calls that raise
+    or are still running when the deadline passes end up in `errors`.
+    """
+    if deadline is None:
+        deadline = get_fanout_config().get("deadline", 8)
+
+    done, _ = wait(futures.values(), timeout=deadline)
+
+    results = {}
+    errors = {}
+    for key, future in futures.items():
+        if future not in done:
+            future.cancel()
+            errors[key] = TimeoutError(f"{key} did not respond within {deadline}s")
+        elif future.exception() is not None:
+            errors[key] = future.exception()
+        else:
+            results[key] = future.result()
+
+    return results, errors
+
+
+def fetch_all(calls, deadline=None):
+    """Run upstream calls concurrently and collect their results.
+
+    `calls` maps a key to a `(provider, fn, *args)` tuple. See `gather` for
+    the return value.
+    """
+    futures = {}
+    for key, (provider, fn, *args) in calls.items():
+        futures[key] = submit(provider, fn, *args)
+    return gather(futures, deadline)
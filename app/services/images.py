@@ -0,0 +1,148 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from app.config import get_images_config
+from app.services import singleflight, upstream
+
+DEFAULT_BASE_URL = "https://image.tmdb.org/t/p"
+# TMDB poster widths; the card grid picks between them with srcset
+DEFAULT_SIZES = ("w92", "w154", "w185", "w342", "w500", "w780")
+TOUCH_INTERVAL = 3600  # Seconds between recency updates of a cached file
+EVICT_TO = 0.9  # Share of max_bytes kept after an eviction pass
+RESCAN_SHARE = 0.05  # Share of max_bytes a process may write before it rescans the directory
+RESCAN_INTERVAL = 300  # Seconds after which the next write rescans anyway
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class ImageCache:
+    """Disk cache for TMDB images, shared by every worker process.
+
+    Files are named by the SHA-256 of their size and TMDB path (TMDB never
+    reuses a path for different bytes). File mtimes record recency: once
+    the cache grows past `max_bytes`, the least recently used files are
+    deleted until it is back under `EVICT_TO` of the limit.
+
+    Each process counts its own writes on top of its last scan of the
+    directory, and rescans after writing `RESCAN_SHARE` of the limit or
+    `RESCAN_INTERVAL` seconds on, so other workers' writes are picked up
+    before the cache can overshoot by much.
+    """
+
+    def __init__(self, root, max_bytes, base_url=DEFAULT_BASE_URL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.base_url = base_url.rstrip("/")
+        self._size = None  # Bytes on disk as of the last scan, plus this process's writes since
+        self._scanned_at = 0
+        self._written = 0  # Bytes this process wrote since the last scan
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, size, path):
+        return hashlib.sha256(f"{size}/{path}".encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def open_image(self, size, path):
+        """Open an image for reading, downloading it on a miss. Returns `(file, key)`."""
+        key = self.key(size, path)
+        filename = self._file(key)
+        try:
+            f = open(filename, "rb")
+        except FileNotFoundError:
+            singleflight.do(f"image:{key}", lambda: self._download(size, path, filename))
+            f = open(filename, "rb")
+
+        # An open file stays readable even if another worker evicts it now
+        now = time.time()
+        if now - os.fstat(f.fileno()).st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(filename, (now, now))
+            except FileNotFoundError:
+                pass
+        return f, key
+
+    def _download(self, size, path, filename):
+        # One metrics label for all posters, not a series per file
+        content, _ = upstream.get_bytes("tmdb", f"{self.base_url}/{size}/{path}", endpoint="/t/p/:size/:file")
+
+        # Write to a temporary file and rename, so readers never see a partial image
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename), prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, filename)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self._added(len(content))
+
+    def _added(self, nbytes):
+        with self._lock:
+            self._written += nbytes
+            if (self._size is None or self._written >= self.max_bytes * RESCAN_SHARE
+                    or time.time() - self._scanned_at >= RESCAN_INTERVAL):
+                self._size = sum(size for _, size, _ in self._scan())
+                self._scanned_at = time.time()
+                self._written = 0
+            else:
+                self._size += nbytes
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """Yield `(path, bytes, mtime)` for every cached file."""
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.startswith("."):
+                    continue  # Still being written
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def _evict(self):
+        """Delete least recently used files. Call with the lock held."""
+        # Rescan, since other worker processes write to the same directory
+        files = sorted(self._scan(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * EVICT_TO
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+        self._scanned_at = time.time()
+        self._written = 0
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = get_images_config()
+                root = config.get("path") or os.path.join(tempfile.gettempdir(), "media-dashboard-images")
+                _cache = ImageCache(
+                    root,
+                    max_bytes=config.get("max_mb", 500) * 1024 * 1024,
+                    base_url=config.get("base_url", DEFAULT_BASE_URL),
+                )
+    return _cache
+
+
+def allowed_sizes():
+    return tuple(get_images_config().get("sizes", DEFAULT_SIZES))
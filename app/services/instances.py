@@ -0,0 +1,129 @@
+from app.services import fanout
+
+
+def load_all(service, instances, load):
+    """Run `load(instance)` for every instance of a service.
+
+    Several instances are loaded concurrently, each under its own fan-out
+    limit (`<service>:<name>`), so the whole call takes about as long as the
+    slowest one. Returns `(results, errors)` keyed by instance name, in
+    config order; instances that fail or miss the deadline are in `errors`.
+    """
+    if len(instances) == 1:
+        instance = instances[0]
+        try:
+            return {instance["name"]: load(instance)}, {}
+        except Exception as e:
+            return {}, {instance["name"]: e}
+
+    calls = {instance["name"]: (f"{service}:{instance['name']}", load, instance) for instance in instances}
+    results, errors = fanout.fetch_all(calls)
+    return {name: results[name] for name in calls if name in results}, errors
+
+
+def require_any(results, errors):
+    """Raise the first error if no instance answered."""
+    if not results and errors:
+        raise next(iter(errors.values()))
+
+
+def health(instances, errors):
+    """Get `{name: {url, ok[, error]}}` for a service's instances."""
+    result = {}
+    for instance in instances:
+        state = {"url": instance.get("url"), "ok": instance["name"] not in errors}
+        if instance["name"] in errors:
+            state["error"] = str(errors[instance["name"]])
+        result[instance["name"]] = state
+    return result
+
+
+def merge_status(statuses, map_paths):
+    """Merge per-instance status results (keyed by instance name) into one.
+
+    An id in several instances gets the most advanced state it has in any of
+    them, in `map_paths` order (downloaded, downloading, queued), taken from
+    the first instance listed. Top-level keys other than the maps are left
+    out.
+    """
+    if len(statuses) == 1:
+        status = next(iter(statuses.values()))
+        return {path[0]: status.get(path[0], {}) for path in map_paths}
+
+    merged = {}
+    claimed = set()
+    for path in map_paths:
+        target = merged
+        for part in path:
+            target = target.setdefault(part, {})
+        for status in statuses.values():
+            entries = status
+            for part in path:
+                entries = entries.get(part, {})
+            for item_id, entry in entries.items():
+                # Ids are claimed per id type, e.g. ("tvdb",); movies only have one
+                if (path[1:], item_id) not in claimed:
+                    claimed.add((path[1:], item_id))
+                    target[item_id] = entry
+    return merged
+
+
+def find(service, instances, name):
+    """Get the instance called `name`."""
+    for instance in instances:
+        if instance["name"] == name:
+            return instance
+    raise ValueError(f"Unknown {service} instance: {name}")
+
+
+def _matches(rules, item):
+    """Check a lookup result against an instance's add rules; every rule given must match."""
+    if "genres" in rules:
+        genres = {genre.lower() for genre in item.get("genres", [])}
+        if not genres & {genre.lower() for genre in rules["genres"]}:
+            return False
+    if "languages" in rules:
+        language = (item.get("originalLanguage") or {}).get("name", "").lower()
+        if language not in {language.lower() for language in rules["languages"]}:
+            return False
+    return True
+
+
+def route(instances, item):
+    """Pick the instance to add `item` (a Radarr/Sonarr lookup result) to.
+
+    Instances with `rules` are tried in order and the first whose rules all
+    match wins. Otherwise the first instance without rules takes it, or the
+    first instance if every one has rules.
+    """
+    for instance in instances:
+        if instance.get("rules") and _matches(instance["rules"], item):
+            return instance
+    for instance in instances:
+        if not instance.get("rules"):
+            return instance
+    return instances[0]
+
+
+def target(service, instances, item, quality_profile_id, name=None, profile_instance=None):
+    """Get `(instance, quality_profile_id)` to add `item` (a lookup result) with.
+
+    The instance is the one called `name`, or else the one `route` picks,
+    which adds with its own `quality_profile_id` if it sets one. Otherwise
+    the caller's profile id is used, which must come from the chosen
+    instance: `profile_instance` says where the caller read it, and may be
+    left out with an explicit `name` or a single instance. Raises ValueError
+    if it belongs to another instance.
+    """
+    instance = find(service, instances, name) if name else route(instances, item)
+    if not name and instance.get("quality_profile_id"):
+        return instance, instance["quality_profile_id"]
+    if profile_instance == instance["name"]:
+        return instance, quality_profile_id
+    if profile_instance is None and (name or len(instances) == 1):
+        # A profile sent with an explicit instance is taken to be from it
+        return instance, quality_profile_id
+    raise ValueError(
+        f"Quality profile {quality_profile_id} is not from {service} instance {instance['name']}; "
+        f"choose a profile from it, or set its quality_profile_id in the config"
+    )
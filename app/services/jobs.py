@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+import uuid
+from app.config import get_jobs_config
+from app.services import cache
+
+logger = logging.getLogger(__name__)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = cache.build_backend(get_jobs_config(), "media-dashboard-jobs.db")
+    return _store
+
+
+def _keep_for():
+    return get_jobs_config().get("keep_for", 86400)
+
+
+def save(job):
+    """Store a job's state where every worker process can read it."""
+    job["updated_at"] = time.time()
+    _get_store().set(f"job:{job['id']}", job, _keep_for())
+
+
+def get(job_id):
+    """Get a job's latest state, or None once it has expired."""
+    cached = _get_store().get(f"job:{job_id}")
+    return cached[0] if cached is not None else None
+
+
+def start(kind, total, run):
+    """Create a job and run `run(job)` on a background thread.
+
+    `run` updates the job dict and calls `save` as it makes progress. The job
+    is marked "done" when it returns, or "failed" with the error if it raises.
+    """
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "running",
+        "total": total,
+        "done": 0,
+        "created_at": time.time(),
+        "finished_at": None,
+    }
+    save(job)
+
+    def target():
+        try:
+            run(job)
+            job["status"] = "done"
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["id"], kind)
+            job["status"] = "failed"
+            job["error"] = str(e)
+        job["finished_at"] = time.time()
+        save(job)
+
+    threading.Thread(target=target, name=f"job-{job['id'][:8]}", daemon=True).start()
+    return job
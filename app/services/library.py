@@ -0,0 +1,113 @@
+import threading
+import time
+from app.config import get_cache_config
+from app.services import cache
+
+STATES = ("downloaded", "downloading", "queued")  # Most advanced first, the order status is checked in
+
+
+def status_keys(media_type, tmdb_id, tvdb_id=None, states=STATES):
+    """Library snapshot keys an item could be under, in lookup order.
+
+    Radarr maps are keyed by tmdb id; Sonarr keeps a tvdb and a tmdb map for
+    each state.
+    """
+    if media_type == "movie":
+        return [(state, tmdb_id) for state in states if tmdb_id]
+    ids = [("tvdb", tvdb_id), ("tmdb", tmdb_id)]
+    return [(state, id_type, item_id) for state in states for id_type, item_id in ids if item_id]
+
+
+def patch_status(status, changed, removed):
+    """Get a copy of a status result with snapshot keys changed and removed.
+
+    Only the maps on the touched keys' paths are copied; the rest are shared
+    with `status`, which is left as it was.
+    """
+    status = dict(status)
+    copied = set()
+
+    def target(path):
+        node = status
+        for depth, part in enumerate(path):
+            if path[:depth + 1] not in copied:
+                node[part] = dict(node.get(part, {}))
+                copied.add(path[:depth + 1])
+            node = node[part]
+        return node
+
+    for key in removed:
+        target(key[:-1]).pop(key[-1], None)
+    for key, entry in changed.items():
+        target(key[:-1])[key[-1]] = entry
+    return status
+
+
+class LibraryRepository:
+    """One parsed copy of an *arr library, shared by every view of it.
+
+    `load()` fetches the library and queue payloads and returns a dict of
+    views built from them (id sets, items keyed by id, status maps). The
+    views are reused until they are as old as the "library" cache TTL, so
+    callers asking for different views within that window share one fetch
+    and one parse. Views are read-only for callers.
+    """
+
+    def __init__(self, name, load):
+        self.name = name
+        self._load = load
+        self._lock = threading.Lock()
+        self._views = None
+        self._loaded_at = 0
+        self._generation = 0
+
+    def _max_age(self):
+        return get_cache_config().get("ttl", {}).get("library", cache.DEFAULT_TTLS["library"])
+
+    def _fresh(self):
+        return self._views is not None and time.time() - self._loaded_at < self._max_age()
+
+    def get(self):
+        """Get the current views, loading them first if they are missing or old."""
+        if self._fresh():
+            return self._views
+        with self._lock:
+            # Another thread may have loaded them while we waited
+            if self._fresh():
+                return self._views
+            return self._reload()
+
+    def refresh(self):
+        """Load the views now, regardless of their age; returns them."""
+        with self._lock:
+            return self._reload()
+
+    def peek(self):
+        """Get the views last loaded, however old, without loading them; None if there are none."""
+        return self._views
+
+    def patch(self, fn):
+        """Replace the loaded views with `fn(views)` instead of reloading them.
+
+        Used to apply a change already known, such as a webhook, without
+        refetching the library. `fn` must not modify the views it is given.
+        Does nothing if no views are loaded.
+        """
+        with self._lock:
+            if self._views is not None:
+                self._views = fn(self._views)
+
+    def invalidate(self):
+        """Drop the views and the cached payloads so the next read fetches the library."""
+        self._generation += 1
+        self._loaded_at = 0
+        cache.invalidate(f"{self.name}:library:")
+
+    def _reload(self):
+        """Call with the lock held."""
+        generation = self._generation
+        views = self._load()
+        self._views = views
+        # A load that raced an invalidation may predate the change; keep it, but only until the next read
+        self._loaded_at = time.time() if generation == self._generation else 0
+        return views
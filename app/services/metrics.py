@@ -0,0 +1,290 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from app.config import get_metrics_config
+from app.services import sqlite
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FLUSH_INTERVAL = 5  # Seconds between writes of this process's metrics to the shared store
+RETIRE_AFTER = 600  # Seconds without a write before a process's metrics are folded into "retired"
+
+# Upstream time spent on behalf of the current request, by provider
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+_registry = []
+_store = None
+_store_lock = threading.Lock()
+_process = f"{os.getpid()}-{secrets.token_hex(4)}"
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """Cumulative histogram with labels, in Prometheus bucket layout."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, counts in self._values.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", key + (str(bound),), count))
+                samples.append((f"{self.name}_bucket", key + ("+Inf",), counts[len(self.buckets)]))
+                samples.append((f"{self.name}_count", key, counts[len(self.buckets)]))
+                samples.append((f"{self.name}_sum", key, counts[-1]))
+        return samples
+
+
+upstream_latency = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of upstream API calls.",
+    ("provider", "endpoint", "method"),
+)
+upstream_responses = Counter(
+    "upstream_responses_total",
+    "Upstream API responses by status code.",
+    ("provider", "endpoint", "status"),
+)
+upstream_retries = Counter(
+    "upstream_retries_total",
+    "Retries made on upstream API calls.",
+    ("provider", "endpoint"),
+)
+upstream_errors = Counter(
+    "upstream_errors_total",
+    "Upstream API calls that failed without a response.",
+    ("provider", "endpoint", "error"),
+)
+circuit_opened = Counter(
+    "upstream_circuit_opened_total",
+    "Times an upstream circuit breaker opened.",
+    ("provider",),
+)
+cache_requests = Counter(
+    "cache_requests_total",
+    "Response cache lookups by result.",
+    ("provider", "result"),
+)
+route_latency = Histogram(
+    "http_request_duration_seconds",
+    "Server time spent on API routes.",
+    ("route", "method", "status"),
+)
+route_errors = Counter(
+    "http_request_errors_total",
+    "API requests that ended in an error, by error type.",
+    ("route", "error"),
+)
+
+_ID_SEGMENT = re.compile(r"(?<=.)/\d+(?=/|$)")
+
+
+def endpoint_label(path):
+    """Collapse numeric ids in a URL path so it can be used as a label."""
+    return _ID_SEGMENT.sub("/:id", path)
+
+
+def start_request_timings():
+    """Start collecting upstream timings for the current request."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def add_request_timing(provider, seconds):
+    """Add upstream time to the current request, if one is being timed."""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[provider] = timings.get(provider, 0) + seconds
+
+
+class SQLiteStore(sqlite.SQLiteFile):
+    """Metrics of every process sharing a SQLite file, summed when read.
+
+    Like prometheus_client's multiprocess mode, each process writes its own
+    running totals (every `FLUSH_INTERVAL` seconds) and readers add them up.
+    Totals of processes that stopped writing are folded into one "retired"
+    row per series, so counters never go backwards as workers restart.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metric_samples ("
+                "process TEXT NOT NULL, metric TEXT NOT NULL, sample TEXT NOT NULL, labels TEXT NOT NULL, "
+                "value NUMERIC NOT NULL, PRIMARY KEY (process, metric, sample, labels))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS metric_processes (process TEXT PRIMARY KEY, written_at REAL NOT NULL)")
+
+    def write(self, process, samples):
+        """Replace `process`'s totals with `samples`, a list of `(metric, sample, labels, value)`."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO metric_samples VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (process, metric, sample, labels) DO UPDATE SET value = excluded.value",
+                [(process, metric, sample, json.dumps(labels), value) for metric, sample, labels, value in samples],
+            )
+            conn.execute(
+                "INSERT INTO metric_processes VALUES (?, ?) ON CONFLICT (process) DO UPDATE SET written_at = excluded.written_at",
+                (process, now),
+            )
+            retired = "SELECT process FROM metric_processes WHERE written_at < ?"
+            conn.execute(
+                "INSERT INTO metric_samples SELECT 'retired', metric, sample, labels, SUM(value) FROM metric_samples "
+                f"WHERE process IN ({retired}) GROUP BY metric, sample, labels "
+                "ON CONFLICT (process, metric, sample, labels) DO UPDATE SET value = value + excluded.value",
+                (now - RETIRE_AFTER,),
+            )
+            conn.execute(f"DELETE FROM metric_samples WHERE process IN ({retired})", (now - RETIRE_AFTER,))
+            conn.execute("DELETE FROM metric_processes WHERE written_at < ?", (now - RETIRE_AFTER,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def read(self, names):
+        """Get `(metric, sample, labels, value)` summed over processes, for the metrics in `names`."""
+        rows = self._connect().execute(
+            "SELECT metric, sample, labels, SUM(value) FROM metric_samples "
+            f"WHERE metric IN ({', '.join('?' * len(names))}) "
+            "GROUP BY metric, sample, labels ORDER BY MIN(rowid)",
+            list(names),
+        ).fetchall()
+        return [(metric, sample, tuple(json.loads(labels)), value) for metric, sample, labels, value in rows]
+
+
+def _get_store():
+    """Get the shared store, or None when metrics are kept per process."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_metrics_config()
+                backend = config.get("backend", "sqlite")
+                if backend == "memory":
+                    _store = False
+                elif backend == "sqlite":
+                    _store = SQLiteStore(sqlite.path(config, "media-dashboard-metrics.db"))
+                else:
+                    raise ValueError(f"Unsupported metrics backend: {backend}")
+    return _store or None
+
+
+def flush():
+    """Write this process's metrics to the shared store, if one is configured."""
+    store = _get_store()
+    if store is not None:
+        store.write(_process, [(metric.name,) + sample for metric in _registry for sample in metric.samples()])
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.warning("Writing metrics failed: %s", e)
+
+
+def start():
+    """Start writing this process's metrics to the shared store in the background."""
+    if _get_store() is not None:
+        threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+
+
+def collect(metrics=None):
+    """Get `{metric name: [(sample, labels, value)...]}` for every process sharing the store.
+
+    Without a shared store, only this process's metrics are included.
+    """
+    metrics = _registry if metrics is None else metrics
+    collected = {metric.name: [] for metric in metrics}
+    store = _get_store()
+    if store is None:
+        for metric in metrics:
+            collected[metric.name] = metric.samples()
+        return collected
+    flush()
+    for name, sample, labels, value in store.read(collected):
+        collected[name].append((sample, labels, value))
+    return collected
+
+
+def totals(metric, labelname):
+    """Sum a counter over every label but `labelname`; returns `{label value: total}`."""
+    index = metric.labelnames.index(labelname)
+    result = {}
+    for _, labels, value in collect([metric])[metric.name]:
+        result[labels[index]] = result.get(labels[index], 0) + value
+    return result
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render():
+    """Render every metric in the Prometheus text exposition format."""
+    lines = []
+    collected = collect()
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        labelnames = metric.labelnames
+        for name, key, value in collected[metric.name]:
+            names = labelnames + ("le",) if len(key) > len(labelnames) else labelnames
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, key))
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return "\n".join(lines) + "\n"
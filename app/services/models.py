@@ -0,0 +1,85 @@
+"""Media records shared by the providers, the library indexers and the search index.
+
+Records trade encoding speed for memory: a 10000-item catalogue holds about
+two thirds of the memory per-item dicts did, but responses have to convert
+records back to dicts first, which makes JSON encoding 1.3-1.5x slower
+than encoding ready-made dicts (see benchmarks/bench_media_record.py).
+"""
+
+
+class MediaRecord:
+    """A movie or TV show from TMDB, Trakt or a Radarr/Sonarr library.
+
+    Uses `__slots__` so large catalogues and the search index don't carry a
+    dict per item. `date` is the release date for movies and the first air
+    date for shows, and is encoded under that name.
+    """
+
+    __slots__ = (
+        "media_type", "tmdb_id", "title", "year", "overview", "poster", "rating", "date",
+        "trakt_id", "imdb_id", "tvdb_id", "watchers",
+    )
+
+    def __init__(self, media_type, tmdb_id, title, year=None, overview="", poster=None, rating=None,
+                 date=None, trakt_id=None, imdb_id=None, tvdb_id=None, watchers=None):
+        self.media_type = media_type
+        self.tmdb_id = tmdb_id
+        self.title = title
+        self.year = year
+        self.overview = overview
+        self.poster = poster
+        self.rating = rating
+        self.date = date
+        self.trakt_id = trakt_id
+        self.imdb_id = imdb_id
+        self.tvdb_id = tvdb_id
+        self.watchers = watchers
+
+    def __eq__(self, other):
+        if not isinstance(other, MediaRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"MediaRecord({self.media_type!r}, {self.tmdb_id!r}, {self.title!r})"
+
+    def copy(self):
+        return MediaRecord(*(getattr(self, name) for name in self.__slots__))
+
+    def fill_from(self, other):
+        """Return a copy with fields that are empty here taken from `other`."""
+        record = self.copy()
+        for name in self.__slots__:
+            if getattr(record, name) in (None, ""):
+                setattr(record, name, getattr(other, name))
+        return record
+
+    def to_dict(self):
+        data = {
+            "tmdb_id": self.tmdb_id,
+            "title": self.title,
+            "year": self.year,
+            "overview": self.overview,
+            "poster": self.poster,
+            "rating": self.rating,
+            "release_date" if self.media_type == "movie" else "first_air_date": self.date,
+            "media_type": self.media_type,
+        }
+        if self.trakt_id is not None:
+            data["trakt_id"] = self.trakt_id
+        if self.imdb_id is not None:
+            data["imdb_id"] = self.imdb_id
+        if self.tvdb_id is not None:
+            data["tvdb_id"] = self.tvdb_id
+        if self.watchers is not None:
+            data["watchers"] = self.watchers
+        return data
+
+
+def to_dicts(records):
+    """Convert records for a JSON response.
+
+    One pass up front is cheaper than having the encoder call back into
+    Python for every record, though still slower than having had dicts.
+    """
+    return [record.to_dict() for record in records]
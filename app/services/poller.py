@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from app.config import get_poller_config, get_radarr_instances, get_sonarr_instances, get_webhooks_config
+from app.services import radarr, sonarr, events, cache, webhooks
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_SYNC_INTERVAL = 2  # Seconds between checks for webhook events other workers received
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+class LibraryPoller(threading.Thread):
+    """Keeps a service's library snapshot up to date off the request path.
+
+    Polls every `interval` seconds, or every `active_interval` seconds while
+    anything is downloading so progress stays current. Once the service
+    sends webhooks, which update the snapshot as they arrive, the full poll
+    becomes a reconciliation every `reconcile_interval` seconds; in between,
+    only the queues are fetched, for download progress. Every
+    `metadata_interval` seconds (and on the first poll) it also checks
+    whether cached profiles and lookups are still valid.
+    """
+
+    def __init__(self, name, service, interval=60, active_interval=10, metadata_interval=300, reconcile_interval=900):
+        super().__init__(name=f"poller-{name}", daemon=True)
+        self.service_name = name
+        self.service = service
+        self.interval = interval
+        self.active_interval = active_interval
+        self.metadata_interval = metadata_interval
+        self.reconcile_interval = reconcile_interval
+        self._metadata_checked_at = 0
+        self._reconciled_at = 0
+        self.last_error = None
+        self.stale = False
+        self._wake = threading.Event()
+
+    def poll(self):
+        """Refresh the snapshot once; returns the new status result.
+
+        Any change after the first poll is published as a `library` event
+        holding the delta.
+        """
+        snapshot = self.service.library_snapshot
+        status = self.service.get_library_with_status()
+        first_poll = snapshot.updated_at is None
+        before = snapshot.version
+        if snapshot.update(status) and not first_poll:
+            events.publish("library", {"service": self.service_name, **snapshot.delta(before)})
+        return status
+
+    def poll_progress(self):
+        """Update download progress from the queues alone; returns True if anything is downloading.
+
+        Titles that start or finish downloading are left to webhooks and the
+        reconciliation. Returns None, without polling, if no library has
+        been loaded to match the queues against.
+        """
+        progress = self.service.get_download_progress()
+        if progress is None:
+            return None
+        snapshot = self.service.library_snapshot
+        downloading = snapshot.entries(("downloading",))
+        changed = {}
+        for key, entry in downloading.items():
+            value = progress.get((entry.get("instance"),) + key[1:])
+            if value is not None and value != entry.get("progress"):
+                changed[key] = {**entry, "progress": value}
+        before = snapshot.version
+        if snapshot.apply(changed):
+            events.publish("library", {"service": self.service_name, **snapshot.delta(before)})
+        return bool(downloading)
+
+    def _poll(self, webhooks_active):
+        """Poll fully, or only for progress while webhooks are active and no reconciliation is due."""
+        reconcile_due = time.time() - self._reconciled_at >= self.reconcile_interval
+        if webhooks_active and not reconcile_due and self.service.library_snapshot.updated_at is not None:
+            downloading = self.poll_progress()
+            if downloading is not None:
+                return downloading
+        status = self.poll()
+        self._reconciled_at = time.time()
+        # Sonarr nests its maps by id type, so check for any non-empty one
+        return any(status.get("downloading", {}).values())
+
+    def run(self):
+        while True:
+            webhooks_active = webhooks.active(self.service_name)
+            interval = self.reconcile_interval if webhooks_active else self.interval
+            stale_providers = cache.start_stale_tracking()
+            try:
+                downloading = self._poll(webhooks_active)
+                self.last_error = None
+                self.stale = bool(stale_providers)
+                if downloading:
+                    interval = self.active_interval
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Polling %s failed: %s", self.name, e)
+            self.check_metadata()
+            self._sleep(interval)
+
+    def _sleep(self, interval):
+        """Wait `interval` seconds, or until woken.
+
+        With webhooks on, events other workers received are applied every
+        few seconds meanwhile, and a grab cuts the wait to `active_interval`
+        so the new download's progress gets polled.
+        """
+        if not webhooks.enabled():
+            self._wake.wait(interval)
+            self._wake.clear()
+            return
+
+        deadline = time.time() + interval
+        while not self._wake.wait(max(0, min(deadline - time.time(), WEBHOOK_SYNC_INTERVAL))):
+            if time.time() >= deadline:
+                break
+            try:
+                webhooks.sync(self.service_name)
+            except Exception as e:
+                logger.warning("Applying %s webhooks failed: %s", self.service_name, e)
+            if webhooks.take_grabbed(self.service_name):
+                deadline = min(deadline, time.time() + self.active_interval)
+        self._wake.clear()
+
+    def check_metadata(self):
+        if time.time() - self._metadata_checked_at < self.metadata_interval:
+            return
+        try:
+            if self.service.check_metadata():
+                logger.info("%s profiles or config changed; dropped cached metadata", self.service_name)
+            self._metadata_checked_at = time.time()
+        except Exception as e:
+            logger.warning("Checking %s metadata failed: %s", self.service_name, e)
+
+    def wake(self, reconcile=False):
+        """Poll again now instead of waiting for the next interval.
+
+        With `reconcile`, the poll is a full one even while webhooks are
+        active, rather than only fetching the queues.
+        """
+        if reconcile:
+            self._reconciled_at = 0
+        self._wake.set()
+
+
+def start_pollers():
+    """Start a poller for each configured *arr service."""
+    config = get_poller_config()
+    if not config.get("enabled", True):
+        return
+
+    # One poller per service; it fetches all of the service's instances at once
+    services = {
+        "radarr": (radarr, get_radarr_instances()),
+        "sonarr": (sonarr, get_sonarr_instances()),
+    }
+    with _pollers_lock:
+        for name, (service, service_instances) in services.items():
+            if name in _pollers or not any(instance.get("api_key") for instance in service_instances):
+                continue
+            poller = LibraryPoller(
+                name,
+                service,
+                interval=config.get("interval", 60),
+                active_interval=config.get("active_interval", 10),
+                metadata_interval=config.get("metadata_interval", 300),
+                reconcile_interval=get_webhooks_config().get("reconcile_interval", 900),
+            )
+            poller.start()
+            _pollers[name] = poller
+
+
+def get_poller(name):
+    """Get the running poller for a service, or None."""
+    return _pollers.get(name)
+
+
+def get_snapshot(name, service):
+    """Get a service's library snapshot.
+
+    When the poller is running the snapshot is only read; otherwise (or
+    before its first poll) it is refreshed inline.
+    """
+    snapshot = service.library_snapshot
+    if get_poller(name) is None or snapshot.updated_at is None:
+        snapshot = service.get_library_snapshot()
+    return snapshot
+
+
+def refresh(name):
+    """Have the library snapshot pick up an add without holding up the request.
+
+    The poller is woken for a full poll in its own thread. Without one,
+    the next read refreshes the snapshot anyway (see `get_snapshot`).
+    """
+    library_poller = get_poller(name)
+    if library_poller is not None:
+        library_poller.wake(reconcile=True)
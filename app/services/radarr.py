@@ -1,78 +1,125 @@
-import requests
-from app.config import get_radarr_config
+import hashlib
+import json
+from app.services import upstream, cache, instances, search_index
+from app.services.library import LibraryRepository, patch_status
+from app.services.models import MediaRecord
+from app.services.snapshot import LibrarySnapshot
+from app.config import get_radarr_config, get_radarr_instances
 
+STATUS_MAPS = (("downloaded",), ("downloading",), ("queued",))
 
-def _get_base_url():
-    config = get_radarr_config()
+library_snapshot = LibrarySnapshot(STATUS_MAPS)
+
+
+def _get_base_url(instance=None):
+    config = instance or get_radarr_config()
     return config.get("url", "http://localhost:7878").rstrip("/")
 
 
-def _get_headers():
-    config = get_radarr_config()
+def _get_headers(instance=None):
+    config = instance or get_radarr_config()
     return {
         "X-Api-Key": config.get("api_key", ""),
         "Content-Type": "application/json",
     }
 
 
-def _make_request(endpoint, method="GET", data=None):
-    url = f"{_get_base_url()}/api/v3{endpoint}"
-    headers = _get_headers()
+def _make_request(endpoint, method="GET", data=None, ttl_class=None, instance=None):
+    """Call an instance's API; the first (default) instance if none is given."""
+    url = f"{_get_base_url(instance)}/api/v3{endpoint}"
+
+    def fetch():
+        return upstream.request("radarr", method, url, headers=_get_headers(instance), data=data)
+
+    if ttl_class is None:
+        return fetch()
+    # Keys are namespaced by class so library changes and metadata changes invalidate separately
+    return cache.get_or_fetch("radarr", cache.make_key(f"radarr:{ttl_class}", url), ttl_class, fetch)
 
-    if method == "GET":
-        response = requests.get(url, headers=headers, timeout=10)
-    elif method == "POST":
-        response = requests.post(url, headers=headers, json=data, timeout=10)
-    else:
-        raise ValueError(f"Unsupported method: {method}")
 
-    response.raise_for_status()
-    return response.json() if response.text else None
+def _load_instance(instance):
+    movies = _make_request("/movie", ttl_class="library", instance=instance)
+    queue = _make_request("/queue", ttl_class="library", instance=instance)
+    return movies, _library_status(movies, queue, instance)
+
+
+def _load_library():
+    """Fetch every instance's library and queue once and build every view of them.
+
+    Instances are fetched concurrently and merged. Their health is reported
+    under `instances` in the status; one that fails is left out.
+    """
+    all_instances = get_radarr_instances()
+    results, errors = instances.load_all("radarr", all_instances, _load_instance)
+    instances.require_any(results, errors)
+
+    by_tmdb = {}
+    queue_ids = {}  # Instance -> Radarr movie id -> tmdb id, to read progress off a queue alone
+    for name, (movies, _) in results.items():
+        queue_ids[name] = {movie.get("id"): movie.get("tmdbId") for movie in movies}
+        for movie in movies:
+            by_tmdb.setdefault(movie.get("tmdbId"), movie)
+    _index_library(by_tmdb.values())
+
+    status = instances.merge_status({name: result[1] for name, result in results.items()}, STATUS_MAPS)
+    status["base_url"] = _get_base_url()
+    status["instances"] = instances.health(all_instances, errors)
+    return {
+        "by_tmdb": by_tmdb,
+        "tmdb_ids": {tmdb_id for tmdb_id in by_tmdb if tmdb_id},
+        "queue_ids": queue_ids,
+        "status": status,
+    }
+
+
+library = LibraryRepository("radarr", _load_library)
 
 
 def get_library():
     """Get all movies in Radarr library."""
-    movies = _make_request("/movie")
-    return {movie.get("tmdbId"): movie for movie in movies}
+    return library.get()["by_tmdb"]
 
 
 def get_library_tmdb_ids():
     """Get set of TMDB IDs for movies in library."""
-    movies = _make_request("/movie")
-    return {movie.get("tmdbId") for movie in movies if movie.get("tmdbId")}
+    return library.get()["tmdb_ids"]
 
 
 def get_library_with_status():
     """Get library with download status."""
-    movies = _make_request("/movie")
-    queue = _make_request("/queue")
-    base_url = _get_base_url()
+    return library.get()["status"]
+
 
-    # Get TMDB IDs and progress of movies currently downloading
+def _queue_progress(queue, tmdb_by_id):
+    """Get `{tmdb_id: progress}` for an instance's queue; `tmdb_by_id` maps its movie ids to tmdb ids."""
     downloading = {}
     for item in queue.get("records", []):
         movie_id = item.get("movieId")
-        if movie_id:
-            # Find the tmdbId for this movie
-            for m in movies:
-                if m.get("id") == movie_id:
-                    tmdb_id = m.get("tmdbId")
-                    size = item.get("size", 0)
-                    sizeleft = item.get("sizeleft", 0)
-                    if size > 0:
-                        progress = round((1 - sizeleft / size) * 100)
-                    else:
-                        progress = 0
-                    downloading[tmdb_id] = {"progress": progress, "radarr_id": m.get("id")}
-                    break
+        if movie_id in tmdb_by_id:
+            size = item.get("size", 0)
+            sizeleft = item.get("sizeleft", 0)
+            if size > 0:
+                progress = round((1 - sizeleft / size) * 100)
+            else:
+                progress = 0
+            downloading[tmdb_by_id[movie_id]] = progress
+    return downloading
+
+
+def _library_status(movies, queue, instance):
+    """Classify every movie in an instance as downloaded, downloading or queued."""
+    base_url = _get_base_url(instance)
+    name = instance["name"]
+    # Index the library by Radarr movie id once, then join the queue onto it
+    downloading = _queue_progress(queue, {m.get("id"): m.get("tmdbId") for m in movies})
 
     result = {
-        "downloaded": {},  # {tmdb_id: {radarr_url: "..."}}
-        "downloading": {},  # {tmdb_id: {progress: X, radarr_url: "..."}}
-        "queued": {},  # {tmdb_id: {radarr_url: "..."}} - in library but not downloaded
-        "base_url": base_url
+        "downloaded": {},  # {tmdb_id: {radarr_url: "...", instance: "..."}}
+        "downloading": {},  # {tmdb_id: {progress: X, radarr_url: "...", instance: "..."}}
+        "queued": {},  # {tmdb_id: {radarr_url: "...", instance: "..."}} - in library but not downloaded
     }
 
+    # Classify every movie in a single pass over the library
     for movie in movies:
         tmdb_id = movie.get("tmdbId")
         title_slug = movie.get("titleSlug")
@@ -82,44 +129,153 @@ def get_library_with_status():
 
         if tmdb_id in downloading:
             result["downloading"][tmdb_id] = {
-                "progress": downloading[tmdb_id]["progress"],
-                "radarr_url": radarr_url
+                "progress": downloading[tmdb_id],
+                "radarr_url": radarr_url,
+                "instance": name,
             }
         elif movie.get("hasFile"):
-            result["downloaded"][tmdb_id] = {"radarr_url": radarr_url}
+            result["downloaded"][tmdb_id] = {"radarr_url": radarr_url, "instance": name}
         else:
-            result["queued"][tmdb_id] = {"radarr_url": radarr_url}
+            result["queued"][tmdb_id] = {"radarr_url": radarr_url, "instance": name}
 
     return result
 
 
+def get_download_progress():
+    """Get `{(instance, tmdb_id): progress}` from every instance's queue, without the library.
+
+    Queue entries are matched to movies through the last library loaded, so
+    only the queues are fetched. Returns None if no library is loaded yet.
+    """
+    views = library.peek()
+    if views is None:
+        return None
+    all_instances = get_radarr_instances()
+    results, errors = instances.load_all(
+        "radarr",
+        all_instances,
+        lambda instance: _make_request("/queue", ttl_class="library", instance=instance),
+    )
+    instances.require_any(results, errors)
+    return {
+        (name, tmdb_id): progress
+        for name, queue in results.items()
+        for tmdb_id, progress in _queue_progress(queue, views["queue_ids"].get(name, {})).items()
+    }
+
+
+def apply_to_library(event, changed, removed):
+    """Apply a webhook's status change to the loaded library views instead of reloading them.
+
+    `changed` and `removed` are the snapshot keys the event changed; a movie
+    with no state left is removed from the id views too.
+    """
+    tmdb_id = event["ids"].get("tmdb")
+    name = event["instance"]
+
+    def patch(views):
+        by_tmdb = dict(views["by_tmdb"])
+        queue_ids = dict(views["queue_ids"])
+        if changed:
+            by_tmdb.setdefault(tmdb_id, {"id": event.get("arr_id"), "tmdbId": tmdb_id, "title": event.get("title")})
+            if event.get("arr_id"):
+                queue_ids[name] = {**queue_ids.get(name, {}), event["arr_id"]: tmdb_id}
+        else:
+            by_tmdb.pop(tmdb_id, None)
+        return {
+            **views,
+            "by_tmdb": by_tmdb,
+            "tmdb_ids": {tmdb_id for tmdb_id in by_tmdb if tmdb_id},
+            "queue_ids": queue_ids,
+            "status": patch_status(views["status"], changed, removed),
+        }
+
+    library.patch(patch)
+
+
+def movie_url(movie, instance=None):
+    """Get a movie's page in an instance's web UI."""
+    # Radarr's title slug is the tmdb id, and webhook payloads leave it out
+    return f"{_get_base_url(instance)}/movie/{movie.get('titleSlug') or movie.get('tmdbId')}"
+
+
+def _index_library(items):
+    """Feed library titles not indexed yet into the local search index."""
+    index = search_index.get_index()
+    records = []
+    for item in items:
+        if ("movie", item.get("tmdbId")) in index:
+            continue
+        posters = [i.get("remoteUrl") for i in item.get("images", []) if i.get("coverType") == "poster"]
+        records.append(MediaRecord(
+            "movie",
+            item.get("tmdbId"),
+            item.get("title"),
+            year=item.get("year"),
+            overview=item.get("overview"),
+            poster=posters[0] if posters else None,
+        ))
+    search_index.add_all(records)
+
+
+def get_library_snapshot():
+    """Refresh the versioned library snapshot and return it."""
+    library_snapshot.update(get_library_with_status())
+    return library_snapshot
+
+
+def _from_each(endpoint, fields):
+    """Get `fields` of every item at a metadata endpoint, from every instance that answers."""
+    all_instances = get_radarr_instances()
+    results, errors = instances.load_all(
+        "radarr",
+        all_instances,
+        lambda instance: _make_request(endpoint, ttl_class="metadata", instance=instance),
+    )
+    instances.require_any(results, errors)
+    return [
+        {**{field: item.get(field) for field in fields}, "instance": name}
+        for name, items in results.items()
+        for item in items
+    ]
+
+
 def get_quality_profiles():
-    """Get available quality profiles."""
-    profiles = _make_request("/qualityprofile")
-    return [{"id": p.get("id"), "name": p.get("name")} for p in profiles]
+    """Get available quality profiles, with the instance each belongs to."""
+    return _from_each("/qualityprofile", ("id", "name"))
 
 
 def get_root_folders():
-    """Get available root folders."""
-    folders = _make_request("/rootfolder")
-    return [{"id": f.get("id"), "path": f.get("path")} for f in folders]
+    """Get available root folders, with the instance each belongs to."""
+    return _from_each("/rootfolder", ("id", "path"))
 
 
 def lookup_movie(tmdb_id):
     """Lookup movie details by TMDB ID."""
-    results = _make_request(f"/movie/lookup/tmdb?tmdbId={tmdb_id}")
+    # Lookups are metadata and the same on every instance, so the default one answers them
+    results = _make_request(f"/movie/lookup/tmdb?tmdbId={tmdb_id}", ttl_class="lookup")
     return results
 
 
-def add_movie(tmdb_id, quality_profile_id, root_folder_path=None):
-    """Add a movie to Radarr."""
-    config = get_radarr_config()
+def add_movie(tmdb_id, quality_profile_id, root_folder_path=None, instance=None, profile_instance=None, invalidate=True):
+    """Add a movie to Radarr.
 
+    Goes to the instance named `instance`, or else the one picked by the
+    instances' add rules, using that instance's `quality_profile_id` if it
+    sets one. `profile_instance` names the instance `quality_profile_id`
+    was read from; a profile from another instance raises ValueError (see
+    `instances.target`). With `invalidate=False` the cached library is left
+    for the caller to drop, as `bulk.add_many` does once per batch.
+    """
     # Lookup movie first
     movie = lookup_movie(tmdb_id)
     if not movie:
         raise ValueError(f"Movie with TMDB ID {tmdb_id} not found")
 
+    config, quality_profile_id = instances.target(
+        "radarr", get_radarr_instances(), movie, quality_profile_id, instance, profile_instance
+    )
+
     # Use provided root folder or default from config
     if not root_folder_path:
         root_folder_path = config.get("root_folder", "/movies")
@@ -137,13 +293,36 @@ def add_movie(tmdb_id, quality_profile_id, root_folder_path=None):
         },
     }
 
-    return _make_request("/movie", method="POST", data=movie_data)
+    result = _make_request("/movie", method="POST", data=movie_data, instance=config)
+    if invalidate:
+        library.invalidate()
+    return result
+
+
+def check_metadata():
+    """Drop cached profiles, root folders and lookups if they changed.
+
+    Changes made in any Radarr instance and to our own radarr config all
+    count. Returns True if they changed.
+    """
+    current = []
+    for instance in get_radarr_instances():
+        profiles = _make_request("/qualityprofile", instance=instance)
+        folders = _make_request("/rootfolder", instance=instance)
+        current.append([instance, profiles, folders])
+    fingerprint = hashlib.sha1(json.dumps(current, sort_keys=True).encode()).hexdigest()
+    return cache.check_fingerprint("radarr:metadata", fingerprint, ("radarr:metadata:", "radarr:lookup:"))
 
 
 def test_connection():
-    """Test connection to Radarr."""
-    try:
-        _make_request("/system/status")
-        return {"success": True}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    """Test connection to every Radarr instance."""
+    all_instances = get_radarr_instances()
+    results, errors = instances.load_all(
+        "radarr",
+        all_instances,
+        lambda instance: _make_request("/system/status", instance=instance),
+    )
+    status = {"success": not errors, "instances": instances.health(all_instances, errors)}
+    if errors:
+        status["error"] = "; ".join(f"{name}: {e}" for name, e in errors.items())
+    return status
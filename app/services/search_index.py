@@ -0,0 +1,228 @@
+import bisect
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from app.config import get_search_config
+
+TITLE_WEIGHT = 3.0
+OVERVIEW_WEIGHT = 1.0
+PREFIX_FACTOR = 0.8
+FUZZY_FACTOR = 0.5
+MIN_FUZZY_LENGTH = 4
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_TOKENS = 200
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase, strip accents and split text into word tokens."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN.findall(text)
+
+
+def _deletes(token):
+    """All variants of a token with one character removed."""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class SearchIndex:
+    """In-memory inverted index over media titles and overviews.
+
+    Documents are keyed by `(media_type, tmdb_id)`. The last query token is
+    matched as a prefix for type-ahead; tokens with no exact or prefix match
+    fall back to single-edit fuzzy matching through a deletion index. Every
+    query token has to match for a document to be returned.
+    """
+
+    def __init__(self, max_docs=50000):
+        self.max_docs = max_docs
+        self._docs = OrderedDict()  # doc key -> record
+        self._doc_tokens = {}  # doc key -> {token: weight}
+        self._titles = {}  # doc key -> normalized title
+        self._postings = {}  # token -> {doc key: weight}
+        self._sorted_tokens = []
+        self._deletes = {}  # token with one char removed -> {tokens}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, key):
+        return key in self._docs
+
+    def add(self, record):
+        """Index a media record, or fill in fields missing from its indexed copy."""
+        if not record.tmdb_id:
+            return
+        key = (record.media_type, record.tmdb_id)
+
+        with self._lock:
+            existing = self._docs.get(key)
+            if existing is not None:
+                # Providers disagree on ratings and year types; keep the first
+                # values seen so repeated pages don't churn the index
+                self._docs.move_to_end(key)
+                merged = existing.fill_from(record)
+                if merged == existing:
+                    return
+                self._remove(key)
+            else:
+                merged = record.copy()
+
+            weights = {}
+            for token in tokenize(merged.overview):
+                weights[token] = max(weights.get(token, 0), OVERVIEW_WEIGHT)
+            title_tokens = tokenize(merged.title)
+            for token in title_tokens:
+                weights[token] = TITLE_WEIGHT
+
+            self._docs[key] = merged
+            self._titles[key] = " ".join(title_tokens)
+            self._doc_tokens[key] = weights
+            for token, weight in weights.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    bisect.insort(self._sorted_tokens, token)
+                    for variant in _deletes(token):
+                        self._deletes.setdefault(variant, set()).add(token)
+                postings[key] = weight
+
+            while len(self._docs) > self.max_docs:
+                self._remove(next(iter(self._docs)))
+
+    def add_all(self, records):
+        for record in records:
+            self.add(record)
+
+    def _remove(self, key):
+        del self._docs[key]
+        del self._titles[key]
+        for token in self._doc_tokens.pop(key):
+            postings = self._postings[token]
+            del postings[key]
+            if not postings:
+                del self._postings[token]
+                del self._sorted_tokens[bisect.bisect_left(self._sorted_tokens, token)]
+                for variant in _deletes(token):
+                    variants = self._deletes[variant]
+                    variants.discard(token)
+                    if not variants:
+                        del self._deletes[variant]
+
+    def _prefix_tokens(self, prefix):
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        tokens = []
+        for token in self._sorted_tokens[start:start + MAX_PREFIX_TOKENS]:
+            if not token.startswith(prefix):
+                break
+            tokens.append(token)
+        return tokens
+
+    def _fuzzy_tokens(self, token):
+        if len(token) < MIN_FUZZY_LENGTH:
+            return set()
+        candidates = set(self._deletes.get(token, ()))
+        for variant in _deletes(token):
+            if variant in self._postings:
+                candidates.add(variant)
+            candidates |= self._deletes.get(variant, set())
+        candidates.discard(token)
+        return candidates
+
+    def _match(self, token, prefix):
+        """Get `{matched token: factor}` for one query token."""
+        matches = {}
+        if token in self._postings:
+            matches[token] = 1.0
+        if prefix and len(token) >= MIN_PREFIX_LENGTH:
+            for candidate in self._prefix_tokens(token):
+                matches.setdefault(candidate, PREFIX_FACTOR)
+        if not matches:
+            for candidate in self._fuzzy_tokens(token):
+                matches[candidate] = FUZZY_FACTOR
+        return matches
+
+    def search(self, query, media_type=None, limit=20, titles_only=False):
+        """Find records matching every token of `query`, best first.
+
+        With `titles_only`, tokens found only in overviews don't match.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            scores = None
+            for i, token in enumerate(tokens):
+                token_scores = {}
+                for candidate, factor in self._match(token, prefix=i == len(tokens) - 1).items():
+                    for key, weight in self._postings[candidate].items():
+                        if media_type and key[0] != media_type:
+                            continue
+                        if titles_only and weight < TITLE_WEIGHT:
+                            continue
+                        score = weight * factor
+                        if score > token_scores.get(key, 0):
+                            token_scores[key] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {key: scores[key] + s for key, s in token_scores.items() if key in scores}
+                if not scores:
+                    return []
+
+            # Titles that start with the query read best as suggestions
+            normalized = " ".join(tokens)
+            for key in scores:
+                if self._titles[key].startswith(normalized):
+                    scores[key] += TITLE_WEIGHT
+
+            ranked = sorted(
+                scores,
+                key=lambda key: (scores[key], self._docs[key].rating or 0),
+                reverse=True,
+            )
+            return [self._docs[key].copy() for key in ranked[:limit]]
+
+
+def matches(record, query):
+    """Check that a record's title has every query token, the last as a prefix.
+
+    Overviews aren't checked: TMDB's search matches titles, so narrowing its
+    results must not let in records that only mention the query.
+    """
+    tokens = tokenize(query)
+    words = set(tokenize(record.title))
+    if not tokens:
+        return False
+    *whole, last = tokens
+    return all(t in words for t in whole) and any(w.startswith(last) for w in words)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SearchIndex(max_docs=get_search_config().get("max_docs", 50000))
+    return _index
+
+
+def add_all(records):
+    """Index records as they pass through the formatters."""
+    get_index().add_all(records)
+
+
+def search(query, media_type=None, limit=20, titles_only=False):
+    """Search the local index."""
+    return get_index().search(query, media_type, limit, titles_only)
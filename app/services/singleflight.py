@@ -0,0 +1,40 @@
+import threading
+from concurrent.futures import Future
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def do(key, fn):
+    """Call `fn` once for every caller asking for `key` at the same time.
+
+    The first caller runs `fn`; callers arriving while it is in flight wait
+    for its result (or exception) instead of making the same call again.
+    Returns `(value, shared)`, where `shared` is True for the waiting callers.
+    """
+    with _calls_lock:
+        future = _calls.get(key)
+        leader = future is None
+        if leader:
+            future = _calls[key] = Future()
+
+    if not leader:
+        return future.result(), True
+
+    try:
+        value = fn()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(value)
+        return value, False
+    finally:
+        with _calls_lock:
+            del _calls[key]
+
+
+def in_flight():
+    """Number of calls currently being made."""
+    with _calls_lock:
+        return len(_calls)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+DIGEST_MOD = 2 ** 64
+_encode = json.JSONEncoder(sort_keys=True, default=str).encode
+
+
+def _digest(value):
+    """Stable 64-bit hash of a JSON-able value, the same in every process."""
+    return int.from_bytes(hashlib.blake2b(_encode(value).encode(), digest_size=8).digest(), "big")
+
+
+class LibrarySnapshot:
+    """Versioned copy of a library status result that can produce deltas.
+
+    `map_paths` lists where the `{id: entry}` maps live inside the status
+    result, e.g. `("downloaded",)` or `("downloaded", "tvdb")`. Every other
+    top-level key (such as `base_url`) is passed through as-is.
+
+    Versions are a digest of the contents rather than a counter, so every
+    gunicorn worker gives the same library the same version. A worker can
+    then answer a delta from a version another worker handed out, as long
+    as it has held those contents itself in its last `max_versions`
+    changes; otherwise the response is a full one.
+    """
+
+    def __init__(self, map_paths, max_tombstones=10000, max_versions=1000):
+        self.map_paths = [tuple(path) for path in map_paths]
+        self.max_tombstones = max_tombstones
+        self.max_versions = max_versions
+        self.updated_at = None
+        self._counter = 0
+        self._floor = 0
+        self._entries = {}  # (path..., id) -> (entry, counter)
+        self._tombstones = {}  # (path..., id) -> counter
+        self._extra = {}
+        self._sum = 0  # Sum of the entries' digests, so changes update it without rehashing everything
+        self._version = f"{0:016x}"
+        self._counters = OrderedDict([(self._version, 0)])  # Recent versions -> counter
+        self._lock = threading.RLock()
+
+    @property
+    def version(self):
+        return self._version
+
+    def _flatten(self, status):
+        flat = {}
+        for path in self.map_paths:
+            current = status
+            for part in path:
+                current = current.get(part, {})
+            for item_id, entry in current.items():
+                flat[path + (item_id,)] = entry
+        return flat
+
+    def update(self, status):
+        """Apply a freshly computed status result; returns True if anything changed."""
+        flat = self._flatten(status)
+        top_level = {path[0] for path in self.map_paths}
+        extra = {k: v for k, v in status.items() if k not in top_level}
+
+        with self._lock:
+            self.updated_at = time.time()
+            changed = {k: entry for k, entry in flat.items() if k not in self._entries or self._entries[k][0] != entry}
+            removed = [k for k in self._entries if k not in flat]
+            if not changed and not removed and extra == self._extra:
+                return False
+
+            self._extra = extra
+            self._commit(changed, removed)
+            return True
+
+    def apply(self, changed, removed=()):
+        """Apply an incremental change without a full status result.
+
+        `changed` maps keys (a map path plus an id) to new entries and
+        `removed` lists keys to drop. Returns True if anything changed.
+        """
+        with self._lock:
+            changed = {k: entry for k, entry in changed.items() if k not in self._entries or self._entries[k][0] != entry}
+            removed = [k for k in removed if k in self._entries and k not in changed]
+            if not changed and not removed:
+                return False
+
+            self._commit(changed, removed)
+            return True
+
+    def _commit(self, changed, removed):
+        """Record changed and removed entries under a new version. Call with the lock held."""
+        self._counter += 1
+        for key, entry in changed.items():
+            if key in self._entries:
+                self._sum -= _digest([key, self._entries[key][0]])
+            self._sum += _digest([key, entry])
+            self._entries[key] = (entry, self._counter)
+            self._tombstones.pop(key, None)
+        for key in removed:
+            self._sum -= _digest([key, self._entries.pop(key)[0]])
+            self._tombstones[key] = self._counter
+
+        extra_digest = _digest(self._extra) if self._extra else 0
+        self._version = f"{(self._sum + extra_digest) % DIGEST_MOD:016x}"
+        self._counters[self._version] = self._counter
+        self._counters.move_to_end(self._version)
+        while len(self._counters) > self.max_versions:
+            self._counters.popitem(last=False)
+
+        if len(self._tombstones) > self.max_tombstones:
+            oldest = sorted(self._tombstones.items(), key=lambda item: item[1])
+            for key, version in oldest[:len(self._tombstones) - self.max_tombstones]:
+                del self._tombstones[key]
+                self._floor = max(self._floor, version)
+
+    @staticmethod
+    def _walk(result, path):
+        for part in path:
+            result = result.setdefault(part, {})
+        return result
+
+    def find(self, keys):
+        """Get `(key, entry)` for the first of `keys` present, or None.
+
+        Keys are a map path plus an id, e.g. `("downloaded", "tvdb", 123)`.
+        """
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    return key, self._entries[key][0]
+        return None
+
+    def entries(self, prefix):
+        """Get `{key: entry}` for the keys under a map path prefix, e.g. `("downloading",)`."""
+        with self._lock:
+            return {key: entry for key, (entry, _) in self._entries.items() if key[:len(prefix)] == prefix}
+
+    def full(self):
+        """Get the whole status result with its version."""
+        with self._lock:
+            result = {}
+            for path in self.map_paths:
+                self._walk(result, path)
+            for key, (entry, _) in self._entries.items():
+                self._walk(result, key[:-1])[key[-1]] = entry
+            return {**self._extra, **result, "version": self.version, "full": True}
+
+    def delta(self, since):
+        """Get the entries changed or removed after version `since`.
+
+        Falls back to the full result if `since` names contents this
+        snapshot hasn't held recently, or is too old to reconstruct from the
+        kept tombstones.
+        """
+        with self._lock:
+            counter = self._counters.get(since)
+            if counter is None or counter < self._floor:
+                return self.full()
+
+            changed = {}
+            for key, (entry, version) in self._entries.items():
+                if version > counter:
+                    self._walk(changed, key[:-1])[key[-1]] = entry
+            removed = {}
+            for key, version in self._tombstones.items():
+                if version > counter:
+                    self._walk(removed, key[:-2]).setdefault(key[-2], []).append(key[-1])
+
+            return {
+                **self._extra,
+                "changed": changed,
+                "removed": removed,
+                "version": self.version,
+                "full": False,
+            }
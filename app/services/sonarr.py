@@ -1,60 +1,107 @@
-import requests
-from app.config import get_sonarr_config
+import hashlib
+import json
+from app.services import upstream, cache, instances, search_index
+from app.services.library import LibraryRepository, patch_status
+from app.services.models import MediaRecord
+from app.services.snapshot import LibrarySnapshot
+from app.config import get_sonarr_config, get_sonarr_instances
 
+STATUS_MAPS = (
+    ("downloaded", "tvdb"), ("downloaded", "tmdb"),
+    ("downloading", "tvdb"), ("downloading", "tmdb"),
+    ("queued", "tvdb"), ("queued", "tmdb"),
+)
 
-def _get_base_url():
-    config = get_sonarr_config()
+library_snapshot = LibrarySnapshot(STATUS_MAPS)
+
+
+def _get_base_url(instance=None):
+    config = instance or get_sonarr_config()
     return config.get("url", "http://localhost:8989").rstrip("/")
 
 
-def _get_headers():
-    config = get_sonarr_config()
+def _get_headers(instance=None):
+    config = instance or get_sonarr_config()
     return {
         "X-Api-Key": config.get("api_key", ""),
         "Content-Type": "application/json",
     }
 
 
-def _make_request(endpoint, method="GET", data=None):
-    url = f"{_get_base_url()}/api/v3{endpoint}"
-    headers = _get_headers()
+def _make_request(endpoint, method="GET", data=None, ttl_class=None, instance=None):
+    """Call an instance's API; the first (default) instance if none is given."""
+    url = f"{_get_base_url(instance)}/api/v3{endpoint}"
+
+    def fetch():
+        return upstream.request("sonarr", method, url, headers=_get_headers(instance), data=data)
+
+    if ttl_class is None:
+        return fetch()
+    # Keys are namespaced by class so library changes and metadata changes invalidate separately
+    return cache.get_or_fetch("sonarr", cache.make_key(f"sonarr:{ttl_class}", url), ttl_class, fetch)
 
-    if method == "GET":
-        response = requests.get(url, headers=headers, timeout=10)
-    elif method == "POST":
-        response = requests.post(url, headers=headers, json=data, timeout=10)
-    else:
-        raise ValueError(f"Unsupported method: {method}")
 
-    response.raise_for_status()
-    return response.json() if response.text else None
+def _load_instance(instance):
+    series_list = _make_request("/series", ttl_class="library", instance=instance)
+    queue = _make_request("/queue", ttl_class="library", instance=instance)
+    return series_list, _library_status(series_list, queue, instance)
+
+
+def _load_library():
+    """Fetch every instance's library and queue once and build every view of them.
+
+    Instances are fetched concurrently and merged. Their health is reported
+    under `instances` in the status; one that fails is left out.
+    """
+    all_instances = get_sonarr_instances()
+    results, errors = instances.load_all("sonarr", all_instances, _load_instance)
+    instances.require_any(results, errors)
+
+    by_tvdb = {}
+    queue_ids = {}  # Instance -> Sonarr series id -> (tvdb id, tmdb id), to read progress off a queue alone
+    for name, (series_list, _) in results.items():
+        queue_ids[name] = {s.get("id"): (s.get("tvdbId"), s.get("tmdbId")) for s in series_list}
+        for s in series_list:
+            by_tvdb.setdefault(s.get("tvdbId"), s)
+    _index_library(by_tvdb.values())
+
+    status = instances.merge_status({name: result[1] for name, result in results.items()}, STATUS_MAPS)
+    status["base_url"] = _get_base_url()
+    status["instances"] = instances.health(all_instances, errors)
+    return {
+        "by_tvdb": by_tvdb,
+        "tvdb_ids": {tvdb_id for tvdb_id in by_tvdb if tvdb_id},
+        "tmdb_ids": {s.get("tmdbId") for s in by_tvdb.values() if s.get("tmdbId")},
+        "queue_ids": queue_ids,
+        "status": status,
+    }
+
+
+library = LibraryRepository("sonarr", _load_library)
 
 
 def get_library():
     """Get all series in Sonarr library."""
-    series = _make_request("/series")
-    return {s.get("tvdbId"): s for s in series}
+    return library.get()["by_tvdb"]
 
 
 def get_library_tvdb_ids():
     """Get set of TVDB IDs for series in library."""
-    series = _make_request("/series")
-    return {s.get("tvdbId") for s in series if s.get("tvdbId")}
+    return library.get()["tvdb_ids"]
 
 
 def get_library_tmdb_ids():
     """Get set of TMDB IDs for series in library."""
-    series = _make_request("/series")
-    return {s.get("tmdbId") for s in series if s.get("tmdbId")}
+    return library.get()["tmdb_ids"]
 
 
 def get_library_with_status():
     """Get library with download status."""
-    series_list = _make_request("/series")
-    queue = _make_request("/queue")
-    base_url = _get_base_url()
+    return library.get()["status"]
 
-    # Get series IDs and progress currently downloading
+
+def _queue_progress(queue):
+    """Get `{series_id: progress}` for an instance's queue."""
     downloading_progress = {}
     for item in queue.get("records", []):
         series_id = item.get("seriesId")
@@ -68,12 +115,20 @@ def get_library_with_status():
             # Keep the highest progress if multiple episodes downloading
             if series_id not in downloading_progress or progress > downloading_progress[series_id]:
                 downloading_progress[series_id] = progress
+    return downloading_progress
+
+
+def _library_status(series_list, queue, instance):
+    """Classify every series in an instance as downloaded, downloading or queued."""
+    base_url = _get_base_url(instance)
+    name = instance["name"]
+    # Get series IDs and progress currently downloading
+    downloading_progress = _queue_progress(queue)
 
     result = {
         "downloaded": {"tvdb": {}, "tmdb": {}},
         "downloading": {"tvdb": {}, "tmdb": {}},
         "queued": {"tvdb": {}, "tmdb": {}},  # in library but no episodes downloaded
-        "base_url": base_url
     }
 
     for series in series_list:
@@ -89,51 +144,162 @@ def get_library_with_status():
             # If also has some episodes downloaded, can still watch in Plex
             has_episodes = episode_file_count > 0
             if tvdb_id:
-                result["downloading"]["tvdb"][tvdb_id] = {"progress": progress, "sonarr_url": sonarr_url, "has_episodes": has_episodes}
+                result["downloading"]["tvdb"][tvdb_id] = {"progress": progress, "sonarr_url": sonarr_url, "has_episodes": has_episodes, "instance": name}
             if tmdb_id:
-                result["downloading"]["tmdb"][tmdb_id] = {"progress": progress, "sonarr_url": sonarr_url, "has_episodes": has_episodes}
+                result["downloading"]["tmdb"][tmdb_id] = {"progress": progress, "sonarr_url": sonarr_url, "has_episodes": has_episodes, "instance": name}
         elif episode_file_count > 0:
             if tvdb_id:
-                result["downloaded"]["tvdb"][tvdb_id] = {"sonarr_url": sonarr_url}
+                result["downloaded"]["tvdb"][tvdb_id] = {"sonarr_url": sonarr_url, "instance": name}
             if tmdb_id:
-                result["downloaded"]["tmdb"][tmdb_id] = {"sonarr_url": sonarr_url}
+                result["downloaded"]["tmdb"][tmdb_id] = {"sonarr_url": sonarr_url, "instance": name}
         else:
             if tvdb_id:
-                result["queued"]["tvdb"][tvdb_id] = {"sonarr_url": sonarr_url}
+                result["queued"]["tvdb"][tvdb_id] = {"sonarr_url": sonarr_url, "instance": name}
             if tmdb_id:
-                result["queued"]["tmdb"][tmdb_id] = {"sonarr_url": sonarr_url}
+                result["queued"]["tmdb"][tmdb_id] = {"sonarr_url": sonarr_url, "instance": name}
 
     return result
 
 
+def get_download_progress():
+    """Get `{(instance, "tvdb" | "tmdb", id): progress}` from every instance's queue, without the library.
+
+    Queue entries are matched to series through the last library loaded, so
+    only the queues are fetched. Returns None if no library is loaded yet.
+    """
+    views = library.peek()
+    if views is None:
+        return None
+    all_instances = get_sonarr_instances()
+    results, errors = instances.load_all(
+        "sonarr",
+        all_instances,
+        lambda instance: _make_request("/queue", ttl_class="library", instance=instance),
+    )
+    instances.require_any(results, errors)
+    progress = {}
+    for name, queue in results.items():
+        ids = views["queue_ids"].get(name, {})
+        for series_id, value in _queue_progress(queue).items():
+            tvdb_id, tmdb_id = ids.get(series_id, (None, None))
+            if tvdb_id:
+                progress[(name, "tvdb", tvdb_id)] = value
+            if tmdb_id:
+                progress[(name, "tmdb", tmdb_id)] = value
+    return progress
+
+
+def apply_to_library(event, changed, removed):
+    """Apply a webhook's status change to the loaded library views instead of reloading them.
+
+    `changed` and `removed` are the snapshot keys the event changed; a series
+    with no state left is removed from the id views too.
+    """
+    tvdb_id, tmdb_id = event["ids"].get("tvdb"), event["ids"].get("tmdb")
+    name = event["instance"]
+
+    def patch(views):
+        by_tvdb = dict(views["by_tvdb"])
+        queue_ids = dict(views["queue_ids"])
+        if changed:
+            if tvdb_id:
+                by_tvdb.setdefault(tvdb_id, {"id": event.get("arr_id"), "tvdbId": tvdb_id, "tmdbId": tmdb_id, "title": event.get("title")})
+            if event.get("arr_id"):
+                queue_ids[name] = {**queue_ids.get(name, {}), event["arr_id"]: (tvdb_id, tmdb_id)}
+        else:
+            by_tvdb.pop(tvdb_id, None)
+        return {
+            **views,
+            "by_tvdb": by_tvdb,
+            "tvdb_ids": {tvdb_id for tvdb_id in by_tvdb if tvdb_id},
+            "tmdb_ids": {s.get("tmdbId") for s in by_tvdb.values() if s.get("tmdbId")},
+            "queue_ids": queue_ids,
+            "status": patch_status(views["status"], changed, removed),
+        }
+
+    library.patch(patch)
+
+
+def series_url(series, instance=None):
+    """Get a series' page in an instance's web UI."""
+    return f"{_get_base_url(instance)}/series/{series.get('titleSlug')}"
+
+
+def _index_library(items):
+    """Feed library titles not indexed yet into the local search index."""
+    index = search_index.get_index()
+    records = []
+    for item in items:
+        if ("tv", item.get("tmdbId")) in index:
+            continue
+        posters = [i.get("remoteUrl") for i in item.get("images", []) if i.get("coverType") == "poster"]
+        records.append(MediaRecord(
+            "tv",
+            item.get("tmdbId"),
+            item.get("title"),
+            year=item.get("year"),
+            overview=item.get("overview"),
+            poster=posters[0] if posters else None,
+            tvdb_id=item.get("tvdbId"),
+        ))
+    search_index.add_all(records)
+
+
+def get_library_snapshot():
+    """Refresh the versioned library snapshot and return it."""
+    library_snapshot.update(get_library_with_status())
+    return library_snapshot
+
+
+def _from_each(endpoint, fields):
+    """Get `fields` of every item at a metadata endpoint, from every instance that answers."""
+    all_instances = get_sonarr_instances()
+    results, errors = instances.load_all(
+        "sonarr",
+        all_instances,
+        lambda instance: _make_request(endpoint, ttl_class="metadata", instance=instance),
+    )
+    instances.require_any(results, errors)
+    return [
+        {**{field: item.get(field) for field in fields}, "instance": name}
+        for name, items in results.items()
+        for item in items
+    ]
+
+
 def get_quality_profiles():
-    """Get available quality profiles."""
-    profiles = _make_request("/qualityprofile")
-    return [{"id": p.get("id"), "name": p.get("name")} for p in profiles]
+    """Get available quality profiles, with the instance each belongs to."""
+    return _from_each("/qualityprofile", ("id", "name"))
 
 
 def get_root_folders():
-    """Get available root folders."""
-    folders = _make_request("/rootfolder")
-    return [{"id": f.get("id"), "path": f.get("path")} for f in folders]
+    """Get available root folders, with the instance each belongs to."""
+    return _from_each("/rootfolder", ("id", "path"))
 
 
 def lookup_series(tvdb_id):
     """Lookup series details by TVDB ID."""
-    results = _make_request(f"/series/lookup?term=tvdb:{tvdb_id}")
+    # Lookups are metadata and the same on every instance, so the default one answers them
+    results = _make_request(f"/series/lookup?term=tvdb:{tvdb_id}", ttl_class="lookup")
     return results[0] if results else None
 
 
 def lookup_series_by_tmdb(tmdb_id):
     """Lookup series details by TMDB ID."""
-    results = _make_request(f"/series/lookup?term=tmdb:{tmdb_id}")
+    results = _make_request(f"/series/lookup?term=tmdb:{tmdb_id}", ttl_class="lookup")
     return results[0] if results else None
 
 
-def add_series(tvdb_id=None, tmdb_id=None, quality_profile_id=None, root_folder_path=None):
-    """Add a series to Sonarr."""
-    config = get_sonarr_config()
+def add_series(tvdb_id=None, tmdb_id=None, quality_profile_id=None, root_folder_path=None, instance=None, profile_instance=None, invalidate=True):
+    """Add a series to Sonarr.
 
+    Goes to the instance named `instance`, or else the one picked by the
+    instances' add rules, using that instance's `quality_profile_id` if it
+    sets one. `profile_instance` names the instance `quality_profile_id`
+    was read from; a profile from another instance raises ValueError (see
+    `instances.target`). With `invalidate=False` the cached library is left
+    for the caller to drop, as `bulk.add_many` does once per batch.
+    """
     # Lookup series first
     if tvdb_id:
         series = lookup_series(tvdb_id)
@@ -145,6 +311,10 @@ def add_series(tvdb_id=None, tmdb_id=None, quality_profile_id=None, root_folder_
     if not series:
         raise ValueError(f"Series not found")
 
+    config, quality_profile_id = instances.target(
+        "sonarr", get_sonarr_instances(), series, quality_profile_id, instance, profile_instance
+    )
+
     # Use provided root folder or default from config
     if not root_folder_path:
         root_folder_path = config.get("root_folder", "/tv")
@@ -163,13 +333,36 @@ def add_series(tvdb_id=None, tmdb_id=None, quality_profile_id=None, root_folder_
         },
     }
 
-    return _make_request("/series", method="POST", data=series_data)
+    result = _make_request("/series", method="POST", data=series_data, instance=config)
+    if invalidate:
+        library.invalidate()
+    return result
+
+
+def check_metadata():
+    """Drop cached profiles, root folders and lookups if they changed.
+
+    Changes made in any Sonarr instance and to our own sonarr config all
+    count. Returns True if they changed.
+    """
+    current = []
+    for instance in get_sonarr_instances():
+        profiles = _make_request("/qualityprofile", instance=instance)
+        folders = _make_request("/rootfolder", instance=instance)
+        current.append([instance, profiles, folders])
+    fingerprint = hashlib.sha1(json.dumps(current, sort_keys=True).encode()).hexdigest()
+    return cache.check_fingerprint("sonarr:metadata", fingerprint, ("sonarr:metadata:", "sonarr:lookup:"))
 
 
 def test_connection():
-    """Test connection to Sonarr."""
-    try:
-        _make_request("/system/status")
-        return {"success": True}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    """Test connection to every Sonarr instance."""
+    all_instances = get_sonarr_instances()
+    results, errors = instances.load_all(
+        "sonarr",
+        all_instances,
+        lambda instance: _make_request("/system/status", instance=instance),
+    )
+    status = {"success": not errors, "instances": instances.health(all_instances, errors)}
+    if errors:
+        status["error"] = "; ".join(f"{name}: {e}" for name, e in errors.items())
+    return status
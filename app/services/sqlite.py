@@ -0,0 +1,31 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+class SQLiteFile:
+    """Base for stores kept in a SQLite file shared by every worker process.
+
+    Each thread opens its own connection on first use, in autocommit mode
+    with WAL journaling, so readers in one process don't block a writer in
+    another.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def path(config, filename):
+    """Get the `path` from a config section, defaulting to `filename` in the temp dir."""
+    return config.get("path") or os.path.join(tempfile.gettempdir(), filename)
@@ -1,8 +1,10 @@
-import requests
+from app.services import upstream, cache, search_index
+from app.services.models import MediaRecord
 from app.config import get_tmdb_config
 
 BASE_URL = "https://api.themoviedb.org/3"
 IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+MIN_NARROW_PREFIX = 2
 
 
 def _get_headers():
@@ -13,52 +15,90 @@ def _get_headers():
     }
 
 
-def _make_request(endpoint, params=None):
+def _make_request(endpoint, params=None, ttl_class=None):
     config = get_tmdb_config()
     api_key = config.get("api_key", "")
+    base_url = config.get("base_url", BASE_URL).rstrip("/")
 
     if params is None:
         params = {}
-    params["api_key"] = api_key
 
-    response = requests.get(f"{BASE_URL}{endpoint}", params=params, timeout=10)
-    response.raise_for_status()
-    return response.json()
+    def fetch():
+        return upstream.request("tmdb", "GET", f"{base_url}{endpoint}", params={**params, "api_key": api_key})
+
+    if ttl_class is None:
+        return fetch()
+    return cache.get_or_fetch("tmdb", cache.make_key("tmdb", endpoint, params), ttl_class, fetch)
 
 
 def get_trending_movies(page=1):
     """Get trending movies for the week."""
-    data = _make_request("/trending/movie/week", {"page": page})
+    data = _make_request("/trending/movie/week", {"page": page}, ttl_class="trending")
     return _format_movies(data.get("results", []))
 
 
 def get_trending_shows(page=1):
     """Get trending TV shows for the week."""
-    data = _make_request("/trending/tv/week", {"page": page})
+    data = _make_request("/trending/tv/week", {"page": page}, ttl_class="trending")
     return _format_shows(data.get("results", []))
 
 
 def search_movies(query, page=1):
     """Search for movies by title."""
-    data = _make_request("/search/movie", {"query": query, "page": page})
+    data = _make_request("/search/movie", {"query": query, "page": page}, ttl_class="search")
     return _format_movies(data.get("results", []))
 
 
 def search_shows(query, page=1):
     """Search for TV shows by title."""
-    data = _make_request("/search/tv", {"query": query, "page": page})
+    data = _make_request("/search/tv", {"query": query, "page": page}, ttl_class="search")
     return _format_shows(data.get("results", []))
 
 
+def get_artwork(media_type, tmdb_id):
+    """Get the poster and basic metadata TMDB has for a movie ("movie") or show ("tv")."""
+    data = _make_request(f"/{media_type}/{tmdb_id}")
+    date_field = "release_date" if media_type == "movie" else "first_air_date"
+    return {
+        "poster": f"{IMAGE_BASE_URL}{data.get('poster_path')}" if data.get("poster_path") else None,
+        "overview": data.get("overview", ""),
+        "date": data.get(date_field),
+    }
+
+
+def narrow_search(media_type, query):
+    """Answer a search from a cached result for a shorter prefix of `query`.
+
+    Only a prefix whose results all fit on the first page is narrowed, since
+    anything matching `query` must then already be in it. Returns None when
+    no such prefix result is cached.
+    """
+    endpoint, format_results = {
+        "movie": ("/search/movie", _format_movies),
+        "tv": ("/search/tv", _format_shows),
+    }[media_type]
+
+    for end in range(len(query) - 1, MIN_NARROW_PREFIX - 1, -1):
+        prefix = query[:end].strip()
+        data = cache.peek(cache.make_key("tmdb", endpoint, {"query": prefix, "page": 1}), "search")
+        if data is None:
+            continue
+        results = data.get("results", [])
+        if data.get("total_results", 0) > len(results):
+            return None  # Shorter prefixes are broader still
+        return [item for item in format_results(results) if search_index.matches(item, query)]
+    return None
+
+
 def get_movie_details(tmdb_id):
     """Get detailed info for a movie."""
-    data = _make_request(f"/movie/{tmdb_id}", {"append_to_response": "external_ids"})
+    data = _make_request(f"/movie/{tmdb_id}", {"append_to_response": "external_ids"}, ttl_class="details")
     return data
 
 
 def get_show_details(tmdb_id):
     """Get detailed info for a TV show."""
-    data = _make_request(f"/tv/{tmdb_id}", {"append_to_response": "external_ids"})
+    data = _make_request(f"/tv/{tmdb_id}", {"append_to_response": "external_ids"}, ttl_class="details")
     return data
 
 
@@ -66,16 +106,17 @@ def _format_movies(results):
     """Format movie results into a consistent structure."""
     movies = []
     for item in results:
-        movies.append({
-            "tmdb_id": item.get("id"),
-            "title": item.get("title", "Unknown"),
-            "year": item.get("release_date", "")[:4] if item.get("release_date") else None,
-            "overview": item.get("overview", ""),
-            "poster": f"{IMAGE_BASE_URL}{item.get('poster_path')}" if item.get("poster_path") else None,
-            "rating": round(item.get("vote_average", 0), 1),
-            "release_date": item.get("release_date"),
-            "media_type": "movie",
-        })
+        movies.append(MediaRecord(
+            "movie",
+            item.get("id"),
+            item.get("title", "Unknown"),
+            year=item.get("release_date", "")[:4] if item.get("release_date") else None,
+            overview=item.get("overview", ""),
+            poster=f"{IMAGE_BASE_URL}{item.get('poster_path')}" if item.get("poster_path") else None,
+            rating=round(item.get("vote_average", 0), 1),
+            date=item.get("release_date"),
+        ))
+    search_index.add_all(movies)
     return movies
 
 
@@ -83,14 +124,15 @@ def _format_shows(results):
     """Format TV show results into a consistent structure."""
     shows = []
     for item in results:
-        shows.append({
-            "tmdb_id": item.get("id"),
-            "title": item.get("name", "Unknown"),
-            "year": item.get("first_air_date", "")[:4] if item.get("first_air_date") else None,
-            "overview": item.get("overview", ""),
-            "poster": f"{IMAGE_BASE_URL}{item.get('poster_path')}" if item.get("poster_path") else None,
-            "rating": round(item.get("vote_average", 0), 1),
-            "first_air_date": item.get("first_air_date"),
-            "media_type": "tv",
-        })
+        shows.append(MediaRecord(
+            "tv",
+            item.get("id"),
+            item.get("name", "Unknown"),
+            year=item.get("first_air_date", "")[:4] if item.get("first_air_date") else None,
+            overview=item.get("overview", ""),
+            poster=f"{IMAGE_BASE_URL}{item.get('poster_path')}" if item.get("poster_path") else None,
+            rating=round(item.get("vote_average", 0), 1),
+            date=item.get("first_air_date"),
+        ))
+    search_index.add_all(shows)
     return shows
@@ -1,4 +1,5 @@
-import requests
+from app.services import upstream, cache, search_index
+from app.services.models import MediaRecord
 from app.config import get_trakt_config
 
 BASE_URL = "https://api.trakt.tv"
@@ -13,84 +14,86 @@ def _get_headers():
     }
 
 
-def _make_request(endpoint, params=None):
+def _make_request(endpoint, params=None, ttl_class=None):
     headers = _get_headers()
-    response = requests.get(f"{BASE_URL}{endpoint}", headers=headers, params=params, timeout=10)
-    response.raise_for_status()
-    return response.json()
+    base_url = get_trakt_config().get("base_url", BASE_URL).rstrip("/")
 
+    def fetch():
+        return upstream.request("trakt", "GET", f"{base_url}{endpoint}", params=params, headers=headers)
 
-def get_trending_movies(limit=50):
+    if ttl_class is None:
+        return fetch()
+    return cache.get_or_fetch("trakt", cache.make_key("trakt", endpoint, params), ttl_class, fetch)
+
+
+def get_trending_movies(limit=50, page=1):
     """Get trending movies on Trakt."""
-    data = _make_request("/movies/trending", {"limit": limit, "extended": "full"})
+    data = _make_request("/movies/trending", {"limit": limit, "page": page, "extended": "full"}, ttl_class="trending")
     return _format_movies(data)
 
 
 def get_popular_movies(limit=50):
     """Get popular movies on Trakt."""
-    data = _make_request("/movies/popular", {"limit": limit, "extended": "full"})
+    data = _make_request("/movies/popular", {"limit": limit, "extended": "full"}, ttl_class="lists")
     return _format_movies_simple(data)
 
 
-def get_trending_shows(limit=50):
+def get_trending_shows(limit=50, page=1):
     """Get trending TV shows on Trakt."""
-    data = _make_request("/shows/trending", {"limit": limit, "extended": "full"})
+    data = _make_request("/shows/trending", {"limit": limit, "page": page, "extended": "full"}, ttl_class="trending")
     return _format_shows(data)
 
 
 def get_popular_shows(limit=50):
     """Get popular TV shows on Trakt."""
-    data = _make_request("/shows/popular", {"limit": limit, "extended": "full"})
+    data = _make_request("/shows/popular", {"limit": limit, "extended": "full"}, ttl_class="lists")
     return _format_shows_simple(data)
 
 
 def get_new_movies(limit=50):
     """Get recently released movies."""
-    data = _make_request("/calendars/movies/new/today/30", {"limit": limit, "extended": "full"})
+    data = _make_request("/calendars/movies/new/today/30", {"limit": limit, "extended": "full"}, ttl_class="lists")
     return _format_calendar_movies(data)
 
 
 def get_new_shows(limit=50):
     """Get new TV show premieres."""
-    data = _make_request("/calendars/shows/new/today/30", {"limit": limit, "extended": "full"})
+    data = _make_request("/calendars/shows/new/today/30", {"limit": limit, "extended": "full"}, ttl_class="lists")
     return _format_calendar_shows(data)
 
 
+def _record(media, media_type, date, watchers=None):
+    """Build a media record from a Trakt movie or show object."""
+    ids = media.get("ids", {})
+    return MediaRecord(
+        media_type,
+        ids.get("tmdb"),
+        media.get("title", "Unknown"),
+        year=media.get("year"),
+        overview=media.get("overview", ""),
+        rating=round(media.get("rating", 0), 1),
+        date=date,
+        trakt_id=ids.get("trakt"),
+        imdb_id=ids.get("imdb"),
+        tvdb_id=ids.get("tvdb") if media_type == "tv" else None,
+        watchers=watchers,
+    )
+
+
 def _format_movies(results):
     """Format trending movie results."""
     movies = []
     for item in results:
         movie = item.get("movie", {})
-        movies.append({
-            "trakt_id": movie.get("ids", {}).get("trakt"),
-            "tmdb_id": movie.get("ids", {}).get("tmdb"),
-            "imdb_id": movie.get("ids", {}).get("imdb"),
-            "title": movie.get("title", "Unknown"),
-            "year": movie.get("year"),
-            "overview": movie.get("overview", ""),
-            "rating": round(movie.get("rating", 0), 1),
-            "release_date": movie.get("released"),
-            "media_type": "movie",
-            "watchers": item.get("watchers", 0),
-        })
+        movies.append(_record(movie, "movie", movie.get("released"), watchers=item.get("watchers", 0)))
+    search_index.add_all(movies)
     return movies
 
 
 def _format_movies_simple(results):
     """Format popular movie results (different structure)."""
-    movies = []
-    for movie in results:
-        movies.append({
-            "trakt_id": movie.get("ids", {}).get("trakt"),
-            "tmdb_id": movie.get("ids", {}).get("tmdb"),
-            "imdb_id": movie.get("ids", {}).get("imdb"),
-            "title": movie.get("title", "Unknown"),
-            "year": movie.get("year"),
-            "overview": movie.get("overview", ""),
-            "rating": round(movie.get("rating", 0), 1),
-            "release_date": movie.get("released"),
-            "media_type": "movie",
-        })
+    movies = [_record(movie, "movie", movie.get("released")) for movie in results]
+    search_index.add_all(movies)
     return movies
 
 
@@ -99,57 +102,22 @@ def _format_shows(results):
     shows = []
     for item in results:
         show = item.get("show", {})
-        shows.append({
-            "trakt_id": show.get("ids", {}).get("trakt"),
-            "tmdb_id": show.get("ids", {}).get("tmdb"),
-            "tvdb_id": show.get("ids", {}).get("tvdb"),
-            "imdb_id": show.get("ids", {}).get("imdb"),
-            "title": show.get("title", "Unknown"),
-            "year": show.get("year"),
-            "overview": show.get("overview", ""),
-            "rating": round(show.get("rating", 0), 1),
-            "first_air_date": show.get("first_aired"),
-            "media_type": "tv",
-            "watchers": item.get("watchers", 0),
-        })
+        shows.append(_record(show, "tv", show.get("first_aired"), watchers=item.get("watchers", 0)))
+    search_index.add_all(shows)
     return shows
 
 
 def _format_shows_simple(results):
     """Format popular TV show results (different structure)."""
-    shows = []
-    for show in results:
-        shows.append({
-            "trakt_id": show.get("ids", {}).get("trakt"),
-            "tmdb_id": show.get("ids", {}).get("tmdb"),
-            "tvdb_id": show.get("ids", {}).get("tvdb"),
-            "imdb_id": show.get("ids", {}).get("imdb"),
-            "title": show.get("title", "Unknown"),
-            "year": show.get("year"),
-            "overview": show.get("overview", ""),
-            "rating": round(show.get("rating", 0), 1),
-            "first_air_date": show.get("first_aired"),
-            "media_type": "tv",
-        })
+    shows = [_record(show, "tv", show.get("first_aired")) for show in results]
+    search_index.add_all(shows)
     return shows
 
 
 def _format_calendar_movies(results):
     """Format calendar movie results."""
-    movies = []
-    for item in results:
-        movie = item.get("movie", {})
-        movies.append({
-            "trakt_id": movie.get("ids", {}).get("trakt"),
-            "tmdb_id": movie.get("ids", {}).get("tmdb"),
-            "imdb_id": movie.get("ids", {}).get("imdb"),
-            "title": movie.get("title", "Unknown"),
-            "year": movie.get("year"),
-            "overview": movie.get("overview", ""),
-            "rating": round(movie.get("rating", 0), 1),
-            "release_date": item.get("released"),
-            "media_type": "movie",
-        })
+    movies = [_record(item.get("movie", {}), "movie", item.get("released")) for item in results]
+    search_index.add_all(movies)
     return movies
 
 
@@ -163,16 +131,6 @@ def _format_calendar_shows(results):
         if tmdb_id in seen_ids:
             continue
         seen_ids.add(tmdb_id)
-        shows.append({
-            "trakt_id": show.get("ids", {}).get("trakt"),
-            "tmdb_id": tmdb_id,
-            "tvdb_id": show.get("ids", {}).get("tvdb"),
-            "imdb_id": show.get("ids", {}).get("imdb"),
-            "title": show.get("title", "Unknown"),
-            "year": show.get("year"),
-            "overview": show.get("overview", ""),
-            "rating": round(show.get("rating", 0), 1),
-            "first_air_date": item.get("first_aired"),
-            "media_type": "tv",
-        })
+        shows.append(_record(show, "tv", item.get("first_aired")))
+    search_index.add_all(shows)
     return shows
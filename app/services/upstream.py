@@ -0,0 +1,164 @@
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.config import get_tmdb_config, get_trakt_config, get_radarr_instances, get_sonarr_instances
+from app.services import metrics
+from app.services.breaker import CircuitBreaker, CircuitOpenError
+
+_PROVIDER_CONFIG = {
+    "tmdb": get_tmdb_config,
+    "trakt": get_trakt_config,
+}
+_PROVIDER_INSTANCES = {
+    "radarr": get_radarr_instances,
+    "sonarr": get_sonarr_instances,
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _get_provider_config(provider, url):
+    """Get a provider's HTTP settings; for Radarr and Sonarr, those of the instance serving `url`."""
+    if provider in _PROVIDER_CONFIG:
+        return _PROVIDER_CONFIG[provider]()
+    instances = _PROVIDER_INSTANCES[provider]()
+    host = urlsplit(url).netloc
+    for instance in instances:
+        if urlsplit(instance.get("url", "")).netloc == host:
+            return instance
+    return instances[0] if instances else {}
+
+
+def _build_session(config):
+    retry = Retry(
+        total=config.get("retries", 2),
+        backoff_factor=config.get("backoff", 0.5),
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    pool_size = config.get("pool_size", 10)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(provider, url):
+    """Get the pooled session for a provider's host."""
+    key = (provider, urlsplit(url).netloc)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _build_session(_get_provider_config(provider, url))
+                _sessions[key] = session
+    return session
+
+
+def _record_failure(provider, breaker):
+    if breaker.record_failure():
+        metrics.circuit_opened.inc(provider=provider)
+
+
+def get_breaker(provider, url):
+    """Get the circuit breaker for a provider's host."""
+    host = urlsplit(url).netloc
+    key = (provider, host)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                config = _get_provider_config(provider, url).get("circuit", {})
+                breaker = CircuitBreaker(
+                    f"{provider} ({host})",
+                    failure_threshold=config.get("failures", 5),
+                    reset_timeout=config.get("reset_timeout", 30),
+                )
+                _breakers[key] = breaker
+    return breaker
+
+
+def breaker_status():
+    """Get the state of every circuit breaker, keyed by provider and host."""
+    return {f"{provider}@{host}": breaker.status() for (provider, host), breaker in _breakers.items()}
+
+
+def _send(provider, method, url, params=None, headers=None, data=None, endpoint=None):
+    """Make a request to an upstream provider and return the checked response.
+
+    Metrics are labelled with the URL path, ids collapsed, unless `endpoint`
+    gives a label; paths with names in them need one to keep labels bounded.
+    """
+    if method not in ("GET", "POST"):
+        raise ValueError(f"Unsupported method: {method}")
+
+    config = _get_provider_config(provider, url)
+    session = get_session(provider, url)
+    breaker = get_breaker(provider, url)
+    endpoint = endpoint or metrics.endpoint_label(urlsplit(url).path)
+
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        metrics.upstream_errors.inc(provider=provider, endpoint=endpoint, error=type(e).__name__)
+        raise
+
+    start = time.perf_counter()
+    try:
+        response = session.request(
+            method,
+            url,
+            params=params,
+            headers=headers,
+            json=data,
+            timeout=config.get("timeout", 10),
+        )
+    except requests.RequestException as e:
+        metrics.upstream_errors.inc(provider=provider, endpoint=endpoint, error=type(e).__name__)
+        _record_failure(provider, breaker)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.upstream_latency.observe(elapsed, provider=provider, endpoint=endpoint, method=method)
+        metrics.add_request_timing(provider, elapsed)
+
+    metrics.upstream_responses.inc(provider=provider, endpoint=endpoint, status=response.status_code)
+    retries = response.raw.retries
+    if retries is not None and retries.history:
+        metrics.upstream_retries.inc(len(retries.history), provider=provider, endpoint=endpoint)
+
+    # Client errors mean the upstream is up; only 429 and 5xx count against it
+    if response.status_code == 429 or response.status_code >= 500:
+        _record_failure(provider, breaker)
+    else:
+        breaker.record_success()
+
+    response.raise_for_status()
+    return response
+
+
+def request(provider, method, url, params=None, headers=None, data=None):
+    """Make a request to an upstream provider and return the decoded JSON."""
+    response = _send(provider, method, url, params=params, headers=headers, data=data)
+    return response.json() if response.text else None
+
+
+def get_bytes(provider, url, endpoint=None):
+    """GET a binary resource from an upstream provider; returns `(content, content_type)`.
+
+    `endpoint` is the metrics label, as for `_send`.
+    """
+    response = _send(provider, "GET", url, endpoint=endpoint)
+    return response.content, response.headers.get("Content-Type")
@@ -0,0 +1,282 @@
+import json
+import logging
+import threading
+import time
+from app.config import get_webhooks_config, get_radarr_instances, get_sonarr_instances
+from app.services import events, instances, radarr, sonarr, sqlite
+from app.services.library import STATES, status_keys
+
+logger = logging.getLogger(__name__)
+
+MAX_LOG = 200  # Events kept in the shared log for workers that haven't applied them yet
+
+SERVICES = {
+    "radarr": (radarr, "movie", "movie", get_radarr_instances),
+    "sonarr": (sonarr, "tv", "series", get_sonarr_instances),
+}
+
+# Connect event type -> state the title moves to; None removes it. Other events only
+# show that webhooks are arriving.
+TRANSITIONS = {
+    "radarr": {
+        "Grab": "downloading",
+        "Download": "downloaded",
+        "MovieAdded": "queued",
+        "MovieFileDelete": "queued",
+        "MovieDelete": None,
+    },
+    "sonarr": {
+        "Grab": "downloading",
+        "Download": "downloaded",
+        "SeriesAdd": "queued",
+        "SeriesDelete": None,
+    },
+}
+ADDED = {"MovieAdded", "SeriesAdd"}
+
+_log = None
+_log_lock = threading.Lock()
+_applied = {}  # Service -> last log sequence applied in this process
+_applied_lock = threading.Lock()
+_grabbed = {name: threading.Event() for name in SERVICES}
+
+
+class MemoryLog:
+    """Per-process event log, for a single worker."""
+
+    def __init__(self, keep_for):
+        self.keep_for = keep_for
+        self._events = {}  # Service -> [(seq, received_at, event)]
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, service, event):
+        now = time.time()
+        with self._lock:
+            self._seq += 1
+            events = self._events.setdefault(service, [])
+            events.append((self._seq, now, event))
+            self._events[service] = [e for e in events if e[1] > now - self.keep_for][-MAX_LOG:]
+            return self._seq
+
+    def since(self, service, seq):
+        with self._lock:
+            return [{**event, "seq": event_seq} for event_seq, _, event in self._events.get(service, []) if event_seq > seq]
+
+    def latest(self, service):
+        """Get `(seq, received_at)` of a service's newest kept event; `(0, None)` if there is none."""
+        with self._lock:
+            events = self._events.get(service)
+            if events and events[-1][1] > time.time() - self.keep_for:
+                return events[-1][:2]
+        return 0, None
+
+
+class SQLiteLog(sqlite.SQLiteFile):
+    """Event log shared by every worker process on the host via a SQLite file.
+
+    Events are appended as rows with an autoincrement sequence, so appends
+    from several workers at once each get their own sequence and none is
+    lost. Events older than `keep_for`, and all but a service's newest
+    `MAX_LOG`, are pruned as new ones arrive.
+    """
+
+    def __init__(self, path, keep_for):
+        super().__init__(path)
+        self.keep_for = keep_for
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS webhook_events ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, service TEXT NOT NULL, "
+                "received_at REAL NOT NULL, event TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS webhook_events_service ON webhook_events (service, seq)")
+
+    def append(self, service, event):
+        now = time.time()
+        conn = self._connect()
+        seq = conn.execute(
+            "INSERT INTO webhook_events (service, received_at, event) VALUES (?, ?, ?)",
+            (service, now, json.dumps(event)),
+        ).lastrowid
+        conn.execute(
+            "DELETE FROM webhook_events WHERE service = ? AND (received_at <= ? OR seq NOT IN ("
+            "SELECT seq FROM webhook_events WHERE service = ? ORDER BY seq DESC LIMIT ?))",
+            (service, now - self.keep_for, service, MAX_LOG),
+        )
+        return seq
+
+    def since(self, service, seq):
+        rows = self._connect().execute(
+            "SELECT seq, event FROM webhook_events WHERE service = ? AND seq > ? ORDER BY seq",
+            (service, seq),
+        ).fetchall()
+        return [{**json.loads(event), "seq": row_seq} for row_seq, event in rows]
+
+    def latest(self, service):
+        """Get `(seq, received_at)` of a service's newest kept event; `(0, None)` if there is none."""
+        row = self._connect().execute(
+            "SELECT seq, received_at FROM webhook_events WHERE service = ? AND received_at > ? "
+            "ORDER BY seq DESC LIMIT 1",
+            (service, time.time() - self.keep_for),
+        ).fetchone()
+        return tuple(row) if row is not None else (0, None)
+
+
+def _get_log():
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                config = get_webhooks_config()
+                keep_for = config.get("keep_for", 86400)
+                backend = config.get("backend", "sqlite")
+                if backend == "memory":
+                    _log = MemoryLog(keep_for)
+                elif backend == "sqlite":
+                    _log = SQLiteLog(sqlite.path(config, "media-dashboard-webhooks.db"), keep_for)
+                else:
+                    raise ValueError(f"Unsupported webhooks backend: {backend}")
+    return _log
+
+
+def enabled():
+    """Webhooks are accepted once a token is configured."""
+    return bool(get_webhooks_config().get("token"))
+
+
+def active(name):
+    """Check whether a service has sent a webhook we act on in the last `keep_for` seconds."""
+    return enabled() and _get_log().latest(name)[1] is not None
+
+
+def _event(name, instance, payload):
+    """Reduce a Connect payload to what applying it needs."""
+    service, _, media_key, _ = SERVICES[name]
+    media = payload.get(media_key) or {}
+    if name == "radarr":
+        ids = {"tmdb": media.get("tmdbId")}
+        url = service.movie_url(media, instance)
+    else:
+        ids = {"tvdb": media.get("tvdbId"), "tmdb": media.get("tmdbId")}
+        url = service.series_url(media, instance)
+    return {
+        "type": payload.get("eventType"),
+        "instance": instance["name"],
+        "ids": {id_type: item_id for id_type, item_id in ids.items() if item_id},
+        "arr_id": media.get("id"),
+        "title": media.get("title"),
+        "url": url,
+    }
+
+
+def receive(name, instance_name, payload):
+    """Record a webhook from a Radarr/Sonarr instance and apply it here.
+
+    The event goes into a log shared by every worker (each applies it to
+    its own snapshot, see `sync`) and then this worker applies it at once.
+    Events that change nothing, such as Connect's "Test", are not logged,
+    so they don't count as webhooks arriving. Raises ValueError for an
+    unknown instance.
+    """
+    service_instances = SERVICES[name][3]()
+    instance = instances.find(name, service_instances, instance_name) if instance_name else service_instances[0]
+    event = _event(name, instance, payload)
+    if event["type"] not in TRANSITIONS[name]:
+        return event
+
+    # Catch up first, so this process doesn't treat the new event as already seen
+    sync(name)
+    _get_log().append(name, event)
+    sync(name)
+    return event
+
+
+def sync(name):
+    """Apply the shared log's events this process hasn't applied yet."""
+    log = _get_log()
+    with _applied_lock:
+        applied = _applied.get(name)
+        latest, _ = log.latest(name)
+        if applied is None:
+            # New process: the next full poll covers anything older
+            _applied[name] = latest
+            return
+        for event in log.since(name, applied):
+            try:
+                apply(name, event)
+            except Exception:
+                logger.exception("Applying %s webhook %s failed", name, event.get("type"))
+            _applied[name] = event["seq"]
+
+
+def take_grabbed(name):
+    """Check whether a webhook started a download since the last call, and reset."""
+    if _grabbed[name].is_set():
+        _grabbed[name].clear()
+        return True
+    return False
+
+
+def _entry(name, state, event, current):
+    """Build the status entry for a title moving to `state`."""
+    current_state, current_entry = current or (None, {})
+    same_instance = current_entry.get("instance") == event["instance"]
+    url_field = f"{name}_url"
+    entry = {
+        url_field: current_entry[url_field] if same_instance and url_field in current_entry else event["url"],
+        "instance": event["instance"],
+    }
+    if state == "downloading":
+        entry["progress"] = current_entry.get("progress", 0) if current_state == "downloading" else 0
+        if name == "sonarr":
+            entry["has_episodes"] = current_state == "downloaded" or current_entry.get("has_episodes", False)
+    return entry
+
+
+def apply(name, event):
+    """Apply one webhook event to a service's snapshot as an incremental change.
+
+    Changes are published as a `library` event, like the poller's, and
+    patched into the loaded library views, so nothing is refetched.
+    Returns True if the snapshot changed.
+    """
+    if event["type"] not in TRANSITIONS[name] or not event["ids"]:
+        return False
+    service, media_type, _, _ = SERVICES[name]
+    snapshot = service.library_snapshot
+    state = TRANSITIONS[name][event["type"]]
+    tmdb_id, tvdb_id = event["ids"].get("tmdb"), event["ids"].get("tvdb")
+
+    found = snapshot.find(status_keys(media_type, tmdb_id, tvdb_id))
+    current = (found[0][0], found[1]) if found else None
+    if current is not None:
+        current_state, current_entry = current
+        rank = STATES.index(state) if state is not None else len(STATES)
+        # Merged status shows each title's most advanced state across instances
+        if current_entry.get("instance") != event["instance"] and rank >= STATES.index(current_state):
+            return False
+        if event["type"] in ADDED:
+            return False
+        if state == "queued" and current_state == "downloading":
+            return False
+        if name == "sonarr" and state == "downloaded" and current_state == "downloading":
+            # One episode imported while others are still downloading
+            state = "downloading"
+            current_entry = {**current_entry, "has_episodes": True}
+            current = (current_state, current_entry)
+
+    changed = {}
+    if state is not None:
+        entry = _entry(name, state, event, current)
+        changed = {key: entry for key in status_keys(media_type, tmdb_id, tvdb_id, states=(state,))}
+    removed = [key for key in status_keys(media_type, tmdb_id, tvdb_id) if key not in changed]
+
+    before = snapshot.version
+    if not snapshot.apply(changed, removed):
+        return False
+    service.apply_to_library(event, changed, removed)
+    if state == "downloading":
+        _grabbed[name].set()
+    events.publish("library", {"service": name, **snapshot.delta(before)})
+    return True
@@ -0,0 +1,280 @@
+"""Load-test every route against local stub upstreams.
+
+Starts stub TMDB, Trakt, Radarr and Sonarr servers in a child process (see
+`benchmarks.stubs`), points a temporary config at them and drives
+`create_app()` with concurrent test clients, one route at a time. For each
+route it reports the first (cold) request and the p50/p99 latency and
+throughput of the rest. It runs entirely offline. Several library sizes run
+one after another, each in a fresh process.
+
+`--json` saves the results; pass a saved file as `--baseline` to compare
+against it. The exit status is 1 if any route's p50 or p99 grew by more
+than `--threshold` (and `--min-delta` ms), or it has errors it didn't have.
+
+Usage: python -m benchmarks.bench_load [--library-size 1000 10000 50000]
+    [--latency 20] [--error-rate 0] [--concurrency 8] [--requests 200] [--route search]
+    [--json results.json] [--baseline baseline.json] [--threshold 0.25] [--min-delta 2]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from benchmarks.stubs import StubProcess
+
+WEBHOOK_TOKEN = "bench"
+
+
+class Context:
+    """What scenarios need to build their requests."""
+
+    def __init__(self, library_size):
+        self.library_size = library_size
+        self.job_id = None
+
+    def new_id(self, i):
+        """An id not in the stub library, so adds aren't skipped as already present."""
+        return self.library_size + 1 + i
+
+    def library_id(self, i):
+        return 1 + i % self.library_size
+
+
+def _items(ctx, i, count=50):
+    return [{"tmdb_id": ctx.library_id(i + j), "tvdb_id": 100000 + ctx.library_id(i + j)} for j in range(count)]
+
+
+# (label, URL rule, make(i, ctx) -> (method, path, json body)), in the order they run.
+# Every rule the app registers needs at least one scenario; main() lists any without one.
+SCENARIOS = [
+    ("GET /api/bootstrap?annotate=1", "/api/bootstrap", lambda i, ctx: ("GET", "/api/bootstrap?tab=movies&annotate=1", None)),
+    ("GET /api/bootstrap", "/api/bootstrap", lambda i, ctx: ("GET", "/api/bootstrap?tab=movies", None)),
+    ("GET /api/movies", "/api/movies", lambda i, ctx: ("GET", f"/api/movies?cursor={i % 8 * 50}&annotate=1", None)),
+    ("GET /api/shows", "/api/shows", lambda i, ctx: ("GET", f"/api/shows?cursor={i % 8 * 50}&annotate=1", None)),
+    ("GET /api/search/movies", "/api/search/movies", lambda i, ctx: ("GET", f"/api/search/movies?query=movie+{i % 100}&annotate=1", None)),
+    ("GET /api/search/shows", "/api/search/shows", lambda i, ctx: ("GET", f"/api/search/shows?query=show+{i % 100}&annotate=1", None)),
+    ("GET /api/search/typeahead", "/api/search/typeahead",
+     lambda i, ctx: ("GET", f"/api/search/typeahead?query=movie+{i % 100}&type=movie&client=bench{i % 8}&seq={i}&annotate=1", None)),
+    ("GET /api/radarr/library", "/api/radarr/library", lambda i, ctx: ("GET", "/api/radarr/library", None)),
+    ("GET /api/sonarr/library", "/api/sonarr/library", lambda i, ctx: ("GET", "/api/sonarr/library", None)),
+    ("POST /api/library/status", "/api/library/status",
+     lambda i, ctx: ("POST", "/api/library/status", {"type": "movie", "items": _items(ctx, i)})),
+    ("GET /api/events", "/api/events", lambda i, ctx: ("GET", "/api/events", None)),
+    ("GET /api/radarr/profiles", "/api/radarr/profiles", lambda i, ctx: ("GET", "/api/radarr/profiles", None)),
+    ("GET /api/sonarr/profiles", "/api/sonarr/profiles", lambda i, ctx: ("GET", "/api/sonarr/profiles", None)),
+    ("POST /api/radarr/lookup/prefetch", "/api/radarr/lookup/prefetch",
+     lambda i, ctx: ("POST", "/api/radarr/lookup/prefetch", {"tmdb_id": ctx.new_id(i)})),
+    ("POST /api/sonarr/lookup/prefetch", "/api/sonarr/lookup/prefetch",
+     lambda i, ctx: ("POST", "/api/sonarr/lookup/prefetch", {"tvdb_id": 100000 + ctx.new_id(i)})),
+    ("POST /api/radarr/add", "/api/radarr/add",
+     lambda i, ctx: ("POST", "/api/radarr/add", {"tmdb_id": ctx.new_id(i), "quality_profile_id": 1})),
+    ("POST /api/sonarr/add", "/api/sonarr/add",
+     lambda i, ctx: ("POST", "/api/sonarr/add", {"tvdb_id": 100000 + ctx.new_id(i), "quality_profile_id": 1})),
+    ("POST /api/radarr/add/bulk", "/api/radarr/add/bulk",
+     lambda i, ctx: ("POST", "/api/radarr/add/bulk", {"tmdb_ids": [ctx.new_id(i * 5 + j) for j in range(5)], "quality_profile_id": 1})),
+    ("POST /api/sonarr/add/bulk", "/api/sonarr/add/bulk",
+     lambda i, ctx: ("POST", "/api/sonarr/add/bulk", {"tvdb_ids": [100000 + ctx.new_id(i * 5 + j) for j in range(5)], "quality_profile_id": 1})),
+    ("GET /api/jobs/<job_id>", "/api/jobs/<job_id>", lambda i, ctx: ("GET", f"/api/jobs/{ctx.job_id}", None)),
+    ("POST /api/webhooks/radarr", "/api/webhooks/<service>",
+     lambda i, ctx: ("POST", f"/api/webhooks/radarr?token={WEBHOOK_TOKEN}", {
+         "eventType": "Grab",
+         "movie": {"tmdbId": ctx.library_id(i), "titleSlug": f"movie-{ctx.library_id(i)}"},
+     })),
+    ("GET /api/status", "/api/status", lambda i, ctx: ("GET", "/api/status", None)),
+    ("GET /api/plex/config", "/api/plex/config", lambda i, ctx: ("GET", "/api/plex/config", None)),
+    ("GET /api/cache/stats", "/api/cache/stats", lambda i, ctx: ("GET", "/api/cache/stats", None)),
+    ("GET /api/metrics", "/api/metrics", lambda i, ctx: ("GET", "/api/metrics", None)),
+    ("GET /img/<size>/<filename>", "/img/<size>/<filename>", lambda i, ctx: ("GET", f"/img/w342/movie{i % 200}.jpg", None)),
+]
+
+
+def write_config(directory, urls):
+    """Write a config pointing every provider at the stubs and keeping state in `directory`."""
+    memory = {"backend": "memory"}
+    config = {
+        "tmdb": {"api_key": "bench", "base_url": f"{urls['tmdb']}/3"},
+        "trakt": {"client_id": "bench", "base_url": urls["trakt"]},
+        "radarr": {"url": urls["radarr"], "api_key": "bench", "root_folder": "/movies"},
+        "sonarr": {"url": urls["sonarr"], "api_key": "bench", "root_folder": "/tv"},
+        "plex": {"url": "http://plex.invalid"},
+        "cache": memory,
+        "enrichment": memory,
+        "jobs": memory,
+        "metrics": memory,
+        "webhooks": {**memory, "token": WEBHOOK_TOKEN},
+        "images": {"path": os.path.join(directory, "images"), "base_url": f"{urls['tmdb']}/t/p"},
+    }
+    path = os.path.join(directory, "config.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f)
+    return path
+
+
+def call(client, method, path, body):
+    """Make one request; returns `(seconds, status)`. Event streams are timed to their first chunk."""
+    start = time.perf_counter()
+    response = client.open(path, method=method, json=body, buffered=False)
+    if response.mimetype == "text/event-stream":
+        next(iter(response.response))
+    else:
+        response.get_data()
+    response.close()
+    return time.perf_counter() - start, response.status_code
+
+
+def run_scenario(app, make, ctx, requests, concurrency):
+    """Time one request cold, then `requests` more across `concurrency` threads."""
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        return call(local.client, *make(i, ctx))
+
+    first, _ = one(0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(1, requests + 1)))
+    elapsed = time.perf_counter() - start
+
+    timings = [seconds for seconds, _ in results]
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, status in results if status >= 400),
+        "first_ms": first * 1000,
+        "p50_ms": cuts[49] * 1000,
+        "p99_ms": cuts[98] * 1000,
+        "rps": requests / elapsed,
+    }
+
+
+def start_job(app, ctx):
+    """Start a background bulk add so /api/jobs/<job_id> has a job to report."""
+    response = app.test_client().post("/api/radarr/add/bulk", json={
+        "tmdb_ids": [ctx.new_id(100000 + i) for i in range(5)],
+        "quality_profile_id": 1,
+        "background": True,
+    })
+    return response.get_json()["job"]["id"]
+
+
+def run(args):
+    """Run every scenario for one library size; returns `{"routes": {label: result}, "upstream_requests": ...}`."""
+    size = args.library_size[0]
+    routes = {}
+    with tempfile.TemporaryDirectory() as directory, StubProcess(size, args.latency / 1000, args.error_rate) as stubs:
+        os.environ["CONFIG_PATH"] = write_config(directory, stubs.urls)
+        # Event streams are capped at a quarter of a worker's threads; allow one per client
+        os.environ.setdefault("THREADS", str(4 * args.concurrency))
+        from app.main import create_app
+        app = create_app()
+
+        rules = {rule.rule for rule in app.url_map.iter_rules() if rule.endpoint != "static" and rule.rule != "/"}
+        missing = sorted(rules - {rule for _, rule, _ in SCENARIOS})
+        if missing:
+            print(f"No scenario for: {', '.join(missing)}", file=sys.stderr)
+
+        ctx = Context(size)
+        ctx.job_id = start_job(app, ctx)
+
+        print(f"library {size} titles, upstream latency {args.latency:g}ms, error rate {args.error_rate:g}, "
+              f"{args.concurrency} concurrent, {args.requests} requests per route")
+        print(f"{'route':<36} {'errors':>6} {'first ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        for label, _, make in SCENARIOS:
+            if args.route and args.route not in label:
+                continue
+            result = routes[label] = run_scenario(app, make, ctx, args.requests, args.concurrency)
+            print(f"{label:<36} {result['errors']:>6} {result['first_ms']:>9.1f} {result['p50_ms']:>8.1f} "
+                  f"{result['p99_ms']:>8.1f} {result['rps']:>8.0f}")
+        upstream_requests = stubs.requests
+        print(f"upstream requests: {json.dumps(upstream_requests)}")
+    return {"routes": routes, "upstream_requests": upstream_requests}
+
+
+def compare(report, baseline, threshold, min_delta):
+    """Print how `report` moved against `baseline`; returns the regressions found."""
+    settings = ("latency", "error_rate", "concurrency", "requests")
+    changed = [name for name in settings if report["settings"].get(name) != baseline["settings"].get(name)]
+    if changed:
+        print(f"Baseline was run with different {', '.join(changed)}", file=sys.stderr)
+
+    regressions = []
+    print(f"{'size':>6} {'route':<36} {'metric':>6} {'baseline':>9} {'now':>9} {'change':>7}")
+    for size, sizes in report["sizes"].items():
+        before_routes = baseline["sizes"].get(size, {}).get("routes", {})
+        for label, result in sizes["routes"].items():
+            before = before_routes.get(label)
+            if before is None:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                old, new = before[metric], result[metric]
+                change = (new - old) / old if old else 0
+                regressed = change > threshold and new - old > min_delta
+                print(f"{size:>6} {label:<36} {metric[:3]:>6} {old:>9.1f} {new:>9.1f} {change:>+7.0%}"
+                      + ("  REGRESSED" if regressed else ""))
+                if regressed:
+                    regressions.append(f"{size} {label} {metric[:3]} {old:.1f}ms -> {new:.1f}ms")
+            if result["errors"] and not before["errors"]:
+                regressions.append(f"{size} {label} now has {result['errors']} errors")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--library-size", type=int, nargs="+", default=[1000], help="Radarr and Sonarr titles")
+    parser.add_argument("--latency", type=float, default=20, help="Milliseconds every upstream request takes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream requests that fail with a 500")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per route, after the first")
+    parser.add_argument("--route", help="Only run routes whose label contains this")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare against results saved with --json; exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative p50/p99 growth that counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=2, help="Milliseconds p50/p99 must also grow by to count")
+    args = parser.parse_args()
+
+    # The app logs every injected upstream failure
+    logging.basicConfig(level=logging.CRITICAL)
+
+    report = {
+        "settings": {name: getattr(args, name) for name in ("latency", "error_rate", "concurrency", "requests")},
+        "sizes": {},
+    }
+    if len(args.library_size) == 1:
+        report["sizes"][str(args.library_size[0])] = run(args)
+    else:
+        # Config and caches are per process, so each size gets a fresh one
+        with tempfile.TemporaryDirectory() as directory:
+            for size in args.library_size:
+                path = os.path.join(directory, f"{size}.json")
+                command = [sys.executable, "-m", "benchmarks.bench_load", "--library-size", str(size),
+                           "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+                           "--concurrency", str(args.concurrency), "--requests", str(args.requests), "--json", path]
+                if args.route:
+                    command += ["--route", args.route]
+                subprocess.run(command, check=True)
+                print()
+                with open(path) as f:
+                    report["sizes"].update(json.load(f)["sizes"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} regressions:", *regressions, sep="\n  ", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark MediaRecord against per-item dicts for large catalogues.
+
+Formats synthetic TMDB results both ways and compares the memory they hold
+and the time to build and JSON-encode them. The previous dict formatter is
+kept here for comparison. Records hold less memory but are slower to
+encode, since they are converted to dicts first (`models.to_dicts`).
+
+Usage: python -m benchmarks.bench_media_record [--size 10000] [--repeat 5]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from app.services import models, search_index, tmdb
+
+
+def make_results(size):
+    return [
+        {
+            "id": 100000 + i,
+            "title": f"Movie {i}",
+            "release_date": f"20{i % 25:02d}-01-01",
+            "overview": f"Overview of movie {i}.",
+            "poster_path": f"/poster{i}.jpg",
+            "vote_average": (i % 100) / 10,
+        }
+        for i in range(size)
+    ]
+
+
+def format_dicts(results):
+    """The original dict-per-item formatter."""
+    movies = []
+    for item in results:
+        movies.append({
+            "tmdb_id": item.get("id"),
+            "title": item.get("title", "Unknown"),
+            "year": item.get("release_date", "")[:4] if item.get("release_date") else None,
+            "overview": item.get("overview", ""),
+            "poster": f"{tmdb.IMAGE_BASE_URL}{item.get('poster_path')}" if item.get("poster_path") else None,
+            "rating": round(item.get("vote_average", 0), 1),
+            "release_date": item.get("release_date"),
+            "media_type": "movie",
+        })
+    return movies
+
+
+def held_bytes(build):
+    """Bytes still allocated by what `build` returns."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del items
+    return held
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Measure formatting alone, not indexing
+    search_index.add_all = lambda records: None
+
+    results = make_results(args.size)
+    dicts = format_dicts(results)
+    records = tmdb._format_movies(results)
+    assert [r.to_dict() for r in records] == dicts
+
+    def dump_dicts():
+        return json.dumps(dicts)
+
+    def dump_records():
+        return json.dumps(models.to_dicts(records))
+
+    assert json.loads(dump_dicts()) == json.loads(dump_records())
+
+    rows = (
+        ("held MB", held_bytes(lambda: format_dicts(results)) / 1e6, held_bytes(lambda: tmdb._format_movies(results)) / 1e6),
+        ("format ms", best_of(lambda: format_dicts(results), args.repeat) * 1000,
+         best_of(lambda: tmdb._format_movies(results), args.repeat) * 1000),
+        ("encode ms", best_of(dump_dicts, args.repeat) * 1000, best_of(dump_records, args.repeat) * 1000),
+    )
+
+    print(f"{args.size} items")
+    print(f"{'':>10} {'dicts':>8} {'records':>8} {'ratio':>6}")
+    for name, dict_value, record_value in rows:
+        print(f"{name:>10} {dict_value:>8.1f} {record_value:>8.1f} {record_value / dict_value:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
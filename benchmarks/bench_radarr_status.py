@@ -0,0 +1,116 @@
+"""Benchmark the Radarr library status and a full library refresh for growing library sizes.
+
+Runs entirely offline on synthetic /movie and /queue payloads for one
+instance. The first table times the status join alone, against the
+previous nested-loop join kept here for comparison. The second times what
+the poller does on a full poll: `LibraryRepository` fetching both payloads
+from stub servers (see `benchmarks.stubs`), parsing them and building its
+views, then a new `LibrarySnapshot` being built from the status.
+
+Usage: python -m benchmarks.bench_radarr_status [--queue-ratio 0.05] [--repeat 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+from app.services import radarr
+from app.services.snapshot import LibrarySnapshot
+from benchmarks.bench_load import write_config
+from benchmarks.stubs import StubData, StubUpstreams
+
+SIZES = (1000, 5000, 10000, 25000, 50000)
+
+
+def make_library(size, queue_ratio):
+    movies = [
+        {"id": i, "tmdbId": 100000 + i, "titleSlug": f"movie-{i}", "hasFile": i % 3 == 0}
+        for i in range(1, size + 1)
+    ]
+    step = max(1, int(1 / queue_ratio)) if queue_ratio else size + 1
+    queue = {
+        "records": [
+            {"movieId": i, "size": 1000, "sizeleft": i % 1000}
+            for i in range(size, 0, -step)
+        ]
+    }
+    return movies, queue
+
+
+def nested_loop_status(movies, queue, base_url, name):
+    """The original O(queue x library) join."""
+    downloading = {}
+    for item in queue.get("records", []):
+        movie_id = item.get("movieId")
+        if movie_id:
+            for m in movies:
+                if m.get("id") == movie_id:
+                    tmdb_id = m.get("tmdbId")
+                    size = item.get("size", 0)
+                    sizeleft = item.get("sizeleft", 0)
+                    progress = round((1 - sizeleft / size) * 100) if size > 0 else 0
+                    downloading[tmdb_id] = {"progress": progress, "radarr_id": m.get("id")}
+                    break
+
+    result = {"downloaded": {}, "downloading": {}, "queued": {}}
+    for movie in movies:
+        tmdb_id = movie.get("tmdbId")
+        if not tmdb_id:
+            continue
+        radarr_url = f"{base_url}/movie/{movie.get('titleSlug')}"
+        if tmdb_id in downloading:
+            result["downloading"][tmdb_id] = {"progress": downloading[tmdb_id]["progress"], "radarr_url": radarr_url, "instance": name}
+        elif movie.get("hasFile"):
+            result["downloaded"][tmdb_id] = {"radarr_url": radarr_url, "instance": name}
+        else:
+            result["queued"][tmdb_id] = {"radarr_url": radarr_url, "instance": name}
+    return result
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queue-ratio", type=float, default=0.05, help="Share of the library in the queue")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    base_url = "http://radarr.local"
+    instance = {"name": "default", "url": base_url}
+
+    print(f"{'movies':>8} {'queue':>6} {'indexed ms':>11} {'nested ms':>10} {'speedup':>8}")
+    for size in SIZES:
+        movies, queue = make_library(size, args.queue_ratio)
+        assert radarr._library_status(movies, queue, instance) == nested_loop_status(movies, queue, base_url, "default")
+
+        indexed = best_of(lambda: radarr._library_status(movies, queue, instance), args.repeat)
+        nested = best_of(lambda: nested_loop_status(movies, queue, base_url, "default"), args.repeat)
+        print(f"{size:>8} {len(queue['records']):>6} {indexed * 1000:>11.1f} {nested * 1000:>10.1f} {nested / indexed:>7.0f}x")
+
+    print()
+    print(f"{'movies':>8} {'refresh ms':>11} {'snapshot ms':>12}")
+    with tempfile.TemporaryDirectory() as directory, StubUpstreams(latency=0) as stubs:
+        os.environ["CONFIG_PATH"] = write_config(directory, stubs.urls)
+
+        def refresh():
+            # Drop the views and cached payloads, as a library change would
+            radarr.library.invalidate()
+            return radarr.library.refresh()["status"]
+
+        for size in SIZES:
+            stubs.data = StubData(size, args.queue_ratio)
+            status = refresh()
+            assert len(status["downloaded"]) + len(status["downloading"]) + len(status["queued"]) == size
+            fetched = best_of(refresh, args.repeat)
+            built = best_of(lambda: LibrarySnapshot(radarr.STATUS_MAPS).update(status), args.repeat)
+            print(f"{size:>8} {fetched * 1000:>11.1f} {built * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
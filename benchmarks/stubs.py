@@ -0,0 +1,315 @@
+"""Local stub servers imitating the TMDB, Trakt, Radarr and Sonarr APIs.
+
+Each provider gets its own HTTP server on 127.0.0.1. Responses are
+synthetic but shaped like the real APIs for every endpoint the app calls.
+Every request waits `latency` seconds and fails with a 500 at
+`error_rate`. Radarr and Sonarr serve `library_size` titles, and a
+`queue_ratio` share of those is downloading.
+
+`StubProcess` runs them in a child process (`python -m benchmarks.stubs`),
+so a load test's timings don't include the stubs competing for the GIL.
+"""
+import argparse
+import json
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import urlopen
+
+PROVIDERS = ("tmdb", "trakt", "radarr", "sonarr")
+TMDB_PAGES = 500  # Pages TMDB reports for trending and search results
+PAGE_SIZE = 20  # TMDB results per page
+COUNTS_PATH = "/__stub/requests"  # Request counts so far; not counted itself
+
+
+def _tmdb_movie(i):
+    return {
+        "id": i,
+        "title": f"Movie {i}",
+        "release_date": f"20{i % 25:02d}-01-01",
+        "overview": f"Overview of movie {i}.",
+        "poster_path": f"/movie{i}.jpg",
+        "vote_average": (i % 100) / 10,
+        "external_ids": {"imdb_id": f"tt{i:07d}"},
+    }
+
+
+def _tmdb_show(i):
+    return {
+        "id": i,
+        "name": f"Show {i}",
+        "first_air_date": f"20{i % 25:02d}-01-01",
+        "overview": f"Overview of show {i}.",
+        "poster_path": f"/show{i}.jpg",
+        "vote_average": (i % 100) / 10,
+        "external_ids": {"tvdb_id": 100000 + i},
+    }
+
+
+def _trakt_media(media_type, i):
+    media = {"title": f"{'Movie' if media_type == 'movie' else 'Show'} {i}", "year": 2000 + i % 25, "rating": (i % 100) / 10}
+    if media_type == "movie":
+        media["ids"] = {"trakt": i, "tmdb": i, "imdb": f"tt{i:07d}"}
+        media["released"] = "2024-01-01"
+    else:
+        media["ids"] = {"trakt": i, "tmdb": i, "tvdb": 100000 + i}
+        media["first_aired"] = "2024-01-01T00:00:00.000Z"
+    return media
+
+
+class StubData:
+    """Payloads shared by the stub servers, encoded once per library size."""
+
+    def __init__(self, library_size, queue_ratio):
+        step = max(1, round(1 / queue_ratio)) if queue_ratio else library_size + 1
+        movies = [
+            {"id": i, "tmdbId": i, "title": f"Movie {i}", "titleSlug": f"movie-{i}", "year": 2000 + i % 25, "hasFile": i % 3 == 0}
+            for i in range(1, library_size + 1)
+        ]
+        series = [
+            {
+                "id": i,
+                "tvdbId": 100000 + i,
+                "tmdbId": i,
+                "title": f"Show {i}",
+                "titleSlug": f"show-{i}",
+                "year": 2000 + i % 25,
+                "statistics": {"episodeFileCount": i % 2 * 10},
+            }
+            for i in range(1, library_size + 1)
+        ]
+        self.encoded = {
+            "radarr:/api/v3/movie": json.dumps(movies).encode(),
+            "radarr:/api/v3/queue": json.dumps({"records": [
+                {"movieId": i, "size": 1000, "sizeleft": i % 1000} for i in range(1, library_size + 1, step)
+            ]}).encode(),
+            "sonarr:/api/v3/series": json.dumps(series).encode(),
+            "sonarr:/api/v3/queue": json.dumps({"records": [
+                {"seriesId": i, "size": 1000, "sizeleft": i % 1000} for i in range(1, library_size + 1, step)
+            ]}).encode(),
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs behind the app's pooled sessions
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, status=200, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _before(self):
+        """Apply the latency and error rate; returns False if the request should fail."""
+        stubs = self.server.stubs
+        stubs.count(self.server.provider)
+        if stubs.latency:
+            time.sleep(stubs.latency)
+        if stubs.error_rate and stubs.random() < stubs.error_rate:
+            self._send({"error": "Injected failure"}, 500)
+            return False
+        return True
+
+    def do_GET(self):
+        if self.path == COUNTS_PATH:
+            return self._send(self.server.stubs.counts())
+        if not self._before():
+            return
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        handler = getattr(self, f"_{self.server.provider}")
+        body = handler(url.path, query)
+        if body is None:
+            return self._send({"error": "Not found"}, 404)
+        self._send(body, content_type="image/jpeg" if url.path.startswith("/t/p/") else "application/json")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self._before():
+            return
+        self._send({**body, "id": random.randint(1000000, 2000000)}, 201)
+
+    def _tmdb(self, path, query):
+        if path.startswith("/t/p/"):
+            return b"\xff\xd8\xff" + path.encode() * 500
+        page = int(query.get("page", 1))
+        offset = (page - 1) * PAGE_SIZE
+        if re.fullmatch(r"/3/(trending|search)/movie(/week)?", path):
+            results = [_tmdb_movie(i) for i in range(offset + 1, offset + PAGE_SIZE + 1)]
+        elif re.fullmatch(r"/3/(trending|search)/tv(/week)?", path):
+            results = [_tmdb_show(i) for i in range(offset + 1, offset + PAGE_SIZE + 1)]
+        else:
+            match = re.fullmatch(r"/3/(movie|tv)/(\d+)", path)
+            if match is None:
+                return None
+            return (_tmdb_movie if match.group(1) == "movie" else _tmdb_show)(int(match.group(2)))
+        return {"page": page, "results": results, "total_pages": TMDB_PAGES, "total_results": TMDB_PAGES * PAGE_SIZE}
+
+    def _trakt(self, path, query):
+        limit = int(query.get("limit", 50))
+        offset = (int(query.get("page", 1)) - 1) * limit
+        match = re.fullmatch(r"/(movies|shows)/(trending|popular)", path) or re.fullmatch(r"/calendars/(movies|shows)/new/.*", path)
+        if match is None:
+            return None
+        media_type = "movie" if match.group(1) == "movies" else "tv"
+        key = "movie" if media_type == "movie" else "show"
+        medias = [_trakt_media(media_type, i) for i in range(offset + 1, offset + limit + 1)]
+        if path.endswith("/popular"):
+            return medias
+        if path.startswith("/calendars/"):
+            return [{key: media, "released": "2024-01-01", "first_aired": "2024-01-01T00:00:00.000Z"} for media in medias]
+        return [{"watchers": 100 - i % 100, key: media} for i, media in enumerate(medias)]
+
+    def _arr(self, path):
+        """Endpoints Radarr and Sonarr share."""
+        encoded = self.server.stubs.data.encoded.get(f"{self.server.provider}:{path}")
+        if encoded is not None:
+            return encoded
+        if path == "/api/v3/qualityprofile":
+            return [{"id": 1, "name": "Any"}, {"id": 4, "name": "HD-1080p"}]
+        if path == "/api/v3/rootfolder":
+            return [{"id": 1, "path": f"/{self.server.provider}"}]
+        if path == "/api/v3/system/status":
+            return {"version": "5.0.0"}
+        return None
+
+    def _radarr(self, path, query):
+        if path == "/api/v3/movie/lookup/tmdb":
+            tmdb_id = int(query["tmdbId"])
+            return {"tmdbId": tmdb_id, "title": f"Movie {tmdb_id}", "year": 2000 + tmdb_id % 25, "genres": ["Drama"]}
+        return self._arr(path)
+
+    def _sonarr(self, path, query):
+        if path == "/api/v3/series/lookup":
+            id_type, _, item_id = query.get("term", "").partition(":")
+            tvdb_id = int(item_id) if id_type == "tvdb" else 100000 + int(item_id)
+            return [{"tvdbId": tvdb_id, "title": f"Show {tvdb_id}", "year": 2000 + tvdb_id % 25, "genres": ["Drama"]}]
+        return self._arr(path)
+
+
+class StubUpstreams:
+    """Start and stop one stub server per provider.
+
+    Usage:
+        with StubUpstreams(library_size=10000, latency=0.02) as stubs:
+            stubs.urls["tmdb"]  # http://127.0.0.1:<port>
+    """
+
+    def __init__(self, library_size=1000, latency=0.02, error_rate=0.0, queue_ratio=0.02, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.data = StubData(library_size, queue_ratio)
+        self.urls = {}
+        self.requests = {provider: 0 for provider in PROVIDERS}
+        self._servers = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def count(self, provider):
+        with self._lock:
+            self.requests[provider] += 1
+
+    def counts(self):
+        with self._lock:
+            return dict(self.requests)
+
+    def start(self):
+        for provider in PROVIDERS:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+            server.daemon_threads = True
+            server.provider = provider
+            server.stubs = self
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+            self.urls[provider] = f"http://127.0.0.1:{server.server_address[1]}"
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class StubProcess:
+    """`StubUpstreams` in a child process, with the same `urls` and `requests`.
+
+    Usage:
+        with StubProcess(library_size=10000, latency=0.02) as stubs:
+            stubs.urls["tmdb"]
+    """
+
+    def __init__(self, library_size=1000, latency=0.02, error_rate=0.0, queue_ratio=0.02, seed=0):
+        self.command = [
+            sys.executable, "-m", "benchmarks.stubs", "--library-size", str(library_size), "--latency", str(latency),
+            "--error-rate", str(error_rate), "--queue-ratio", str(queue_ratio), "--seed", str(seed),
+        ]
+        self.urls = {}
+        self._process = None
+
+    @property
+    def requests(self):
+        """Requests each stub has served so far."""
+        with urlopen(self.urls["tmdb"] + COUNTS_PATH) as response:
+            return json.load(response)
+
+    def start(self):
+        self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        line = self._process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Stub process exited with {self._process.wait()}")
+        self.urls = json.loads(line)
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            # Closing stdin tells the child to shut down
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub upstreams until stdin closes; prints their URLs as JSON.")
+    parser.add_argument("--library-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds every request takes")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--queue-ratio", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with StubUpstreams(args.library_size, args.latency, args.error_rate, args.queue_ratio, args.seed) as stubs:
+        print(json.dumps(stubs.urls), flush=True)
+        sys.stdin.read()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# Gunicorn settings
+#
+# SERVER_MODE=sync (default) runs threaded workers. Each open /api/events
+# stream (one per dashboard tab) holds a thread for up to 5 minutes, so a
+# worker serves at most THREADS // 4 streams and refuses more with a 503;
+# those tabs fall back to polling.
+# SERVER_MODE=async runs gevent workers: upstream I/O in the API handlers and
+# service clients becomes non-blocking, so one process can hold hundreds of
+# dashboard requests that are waiting on TMDB, Trakt or the *arr instances.
+# Event streams aren't limited in this mode.
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WORKERS", "2"))
+
+if os.environ.get("SERVER_MODE", "sync") == "async":
+    worker_class = "gevent"
+    worker_connections = int(os.environ.get("WORKER_CONNECTIONS", "1000"))
+else:
+    worker_class = "gthread"
+    threads = int(os.environ.get("THREADS", "16"))
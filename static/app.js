@@ -1,19 +1,27 @@
 // State
 let currentTab = 'movies';
-let radarrDownloaded = {};  // {tmdb_id: {radarr_url}}
-let radarrDownloading = {};  // {tmdb_id: {progress, radarr_url}}
-let radarrQueued = {};  // {tmdb_id: {radarr_url}} - in library but not downloaded
-let sonarrDownloadedTvdb = {};  // {tvdb_id: {sonarr_url}}
-let sonarrDownloadedTmdb = {};  // {tmdb_id: {sonarr_url}}
-let sonarrDownloadingTvdb = {};  // {tvdb_id: {progress, sonarr_url, has_episodes}}
-let sonarrDownloadingTmdb = {};  // {tmdb_id: {progress, sonarr_url, has_episodes}}
-let sonarrQueuedTvdb = {};  // {tvdb_id: {sonarr_url}}
-let sonarrQueuedTmdb = {};  // {tmdb_id: {sonarr_url}}
 let radarrProfiles = [];
 let sonarrProfiles = [];
 let currentItem = null;
 let isSearchMode = false;
 let plexUrl = 'https://app.plex.tv/desktop';
+let currentItems = [];  // Items on screen, each annotated by the server with its library status
+let nextCursor = null;  // Cursor for the next catalogue page, null when there is none
+let loadingMore = false;
+let typeaheadTimer = null;
+let typeaheadSeq = 0;
+let typeaheadController = null;
+const typeaheadClient = Math.random().toString(36).slice(2);
+
+const LIBRARY_REFRESH_MS = 30000;
+const EVENTS_RETRY_MS = 60000;
+const LIBRARY_STATES = ['downloaded', 'downloading', 'queued'];  // In the order the server checks them
+const STATUS_BATCH = 1000;  // Most items per library status request
+// Posters are served through the local image cache, at widths that fit the card grid
+const TMDB_IMAGE_URL = /^https:\/\/image\.tmdb\.org\/t\/p\/\w+\/([\w-]+\.\w+)$/;
+const POSTER_WIDTHS = ['w185', 'w342', 'w500'];
+const POSTER_SIZES = '(min-width: 1024px) 20vw, (min-width: 768px) 25vw, (min-width: 640px) 33vw, 50vw';
+const TYPEAHEAD_DELAY_MS = 250;
 
 // DOM Elements
 const moviesTab = document.getElementById('movies-tab');
@@ -25,26 +33,37 @@ const errorMessage = document.getElementById('error-message');
 const searchInput = document.getElementById('search-input');
 const searchBtn = document.getElementById('search-btn');
 const clearSearchBtn = document.getElementById('clear-search-btn');
+const searchSuggestions = document.getElementById('search-suggestions');
 const addModal = document.getElementById('add-modal');
 const modalTitle = document.getElementById('modal-title');
 const qualityProfile = document.getElementById('quality-profile');
+const addInstanceField = document.getElementById('add-instance-field');
+const addInstance = document.getElementById('add-instance');
 const modalCancel = document.getElementById('modal-cancel');
 const modalConfirm = document.getElementById('modal-confirm');
 const toastContainer = document.getElementById('toast-container');
+const scrollSentinel = document.getElementById('scroll-sentinel');
 
 // Initialize
 async function init() {
-    // Load libraries, profiles, and plex config
-    await Promise.all([
-        loadRadarrLibrary(),
-        loadSonarrLibrary(),
-        loadRadarrProfiles(),
-        loadSonarrProfiles(),
-        loadPlexConfig(),
-    ]);
-
-    // Load initial content
-    loadContent();
+    // Load profiles, plex config and initial content in one request
+    if (!await loadBootstrap()) {
+        await Promise.all([
+            loadRadarrProfiles(),
+            loadSonarrProfiles(),
+            loadPlexConfig(),
+        ]);
+        loadContent();
+    }
+
+    // Keep library status fresh: pushed progress, plus periodic re-checks as a fallback
+    subscribeToEvents();
+    setInterval(refreshStatus, LIBRARY_REFRESH_MS);
+
+    // Load the next catalogue page as the end of the grid scrolls into view
+    new IntersectionObserver((entries) => {
+        if (entries[0].isIntersecting) loadMore();
+    }, { rootMargin: '600px' }).observe(scrollSentinel);
 
     // Event listeners
     moviesTab.addEventListener('click', () => switchTab('movies'));
@@ -54,8 +73,13 @@ async function init() {
     searchInput.addEventListener('keypress', (e) => {
         if (e.key === 'Enter') search();
     });
+    searchInput.addEventListener('input', () => {
+        clearTimeout(typeaheadTimer);
+        typeaheadTimer = setTimeout(typeahead, TYPEAHEAD_DELAY_MS);
+    });
     modalCancel.addEventListener('click', closeModal);
     modalConfirm.addEventListener('click', confirmAdd);
+    addInstance.addEventListener('change', renderProfileOptions);
     addModal.addEventListener('click', (e) => {
         if (e.target === addModal) closeModal();
     });
@@ -63,6 +87,7 @@ async function init() {
 
 // Tab switching
 function switchTab(tab) {
+    cancelTypeahead();
     currentTab = tab;
     isSearchMode = false;
     clearSearchBtn.classList.add('hidden');
@@ -90,10 +115,11 @@ async function loadContent() {
 
     try {
         const endpoint = currentTab === 'movies' ? '/api/movies' : '/api/shows';
-        const response = await fetch(endpoint);
+        const response = await fetch(`${endpoint}?annotate=1`);
         const data = await response.json();
 
         if (data.success) {
+            nextCursor = data.next_cursor;
             renderContent(data.data);
         } else {
             showError(data.error || 'Failed to load content');
@@ -105,11 +131,35 @@ async function loadContent() {
     hideLoading();
 }
 
+// Append the next catalogue page (infinite scroll)
+async function loadMore() {
+    if (loadingMore || isSearchMode || !nextCursor) return;
+
+    loadingMore = true;
+    const tab = currentTab;
+    try {
+        const endpoint = tab === 'movies' ? '/api/movies' : '/api/shows';
+        const response = await fetch(`${endpoint}?cursor=${encodeURIComponent(nextCursor)}&annotate=1`);
+        const data = await response.json();
+
+        // Drop the page if the user switched tabs or started searching meanwhile
+        if (data.success && tab === currentTab && !isSearchMode) {
+            nextCursor = data.next_cursor;
+            appendContent(data.data);
+        }
+    } catch (e) {
+        console.error('Failed to load more:', e);
+    } finally {
+        loadingMore = false;
+    }
+}
+
 // Search
 async function search() {
     const query = searchInput.value.trim();
     if (!query) return;
 
+    cancelTypeahead();
     isSearchMode = true;
     clearSearchBtn.classList.remove('hidden');
     showLoading();
@@ -117,7 +167,7 @@ async function search() {
 
     try {
         const endpoint = currentTab === 'movies' ? '/api/search/movies' : '/api/search/shows';
-        const response = await fetch(`${endpoint}?query=${encodeURIComponent(query)}`);
+        const response = await fetch(`${endpoint}?query=${encodeURIComponent(query)}&annotate=1`);
         const data = await response.json();
 
         if (data.success) {
@@ -132,7 +182,56 @@ async function search() {
     hideLoading();
 }
 
+// Cancel any type-ahead request still in flight; its results are no longer wanted
+function cancelTypeahead() {
+    clearTimeout(typeaheadTimer);
+    typeaheadSeq++;
+    if (typeaheadController) {
+        typeaheadController.abort();
+        typeaheadController = null;
+    }
+}
+
+// Live results and title suggestions while the user types
+async function typeahead() {
+    const query = searchInput.value.trim();
+    cancelTypeahead();
+    if (query.length < 2) {
+        searchSuggestions.innerHTML = '';
+        return;
+    }
+
+    const seq = typeaheadSeq;
+    const controller = new AbortController();
+    typeaheadController = controller;
+
+    try {
+        const type = currentTab === 'movies' ? 'movie' : 'tv';
+        const params = new URLSearchParams({ query, type, seq, client: typeaheadClient, annotate: 1 });
+        const response = await fetch(`/api/search/typeahead?${params}`, { signal: controller.signal });
+        const data = await response.json();
+        if (!data.success || data.superseded || seq !== typeaheadSeq) return;
+
+        searchSuggestions.innerHTML = '';
+        for (const item of data.data.slice(0, 8)) {
+            const option = document.createElement('option');
+            option.value = item.title;
+            if (item.year) option.label = `${item.title} (${item.year})`;
+            searchSuggestions.appendChild(option);
+        }
+
+        isSearchMode = true;
+        clearSearchBtn.classList.remove('hidden');
+        renderContent(data.data);
+    } catch (e) {
+        // Aborted or failed type-ahead requests are superseded by the next keystroke or search
+    } finally {
+        if (typeaheadController === controller) typeaheadController = null;
+    }
+}
+
 function clearSearch() {
+    cancelTypeahead();
     isSearchMode = false;
     searchInput.value = '';
     clearSearchBtn.classList.add('hidden');
@@ -141,6 +240,7 @@ function clearSearch() {
 
 // Render content grid
 function renderContent(items) {
+    currentItems = items || [];
     contentGrid.innerHTML = '';
 
     if (!items || items.length === 0) {
@@ -154,57 +254,42 @@ function renderContent(items) {
     });
 }
 
-// Get item status and progress
-function getItemStatus(item) {
-    const tmdbId = String(item.tmdb_id);
-    const tvdbId = String(item.tvdb_id);
+function appendContent(items) {
+    const shown = new Set(currentItems.map(item => item.tmdb_id));
+    const added = items.filter(item => !shown.has(item.tmdb_id));
+    currentItems = currentItems.concat(added);
+    added.forEach(item => {
+        contentGrid.appendChild(createCard(item));
+    });
+}
 
-    if (currentTab === 'movies') {
-        if (tmdbId in radarrDownloaded) {
-            return { status: 'downloaded', progress: 100, arrUrl: radarrDownloaded[tmdbId].radarr_url };
-        }
-        if (tmdbId in radarrDownloading) {
-            const data = radarrDownloading[tmdbId];
-            return { status: 'downloading', progress: data.progress, arrUrl: data.radarr_url };
-        }
-        if (tmdbId in radarrQueued) {
-            return { status: 'queued', progress: 0, arrUrl: radarrQueued[tmdbId].radarr_url };
-        }
-    } else {
-        // Check downloaded
-        if (tvdbId in sonarrDownloadedTvdb) {
-            return { status: 'downloaded', progress: 100, arrUrl: sonarrDownloadedTvdb[tvdbId].sonarr_url };
-        }
-        if (tmdbId in sonarrDownloadedTmdb) {
-            return { status: 'downloaded', progress: 100, arrUrl: sonarrDownloadedTmdb[tmdbId].sonarr_url };
-        }
-        // Check downloading
-        if (tvdbId in sonarrDownloadingTvdb) {
-            const data = sonarrDownloadingTvdb[tvdbId];
-            return { status: 'downloading', progress: data.progress, arrUrl: data.sonarr_url, hasEpisodes: data.has_episodes };
-        }
-        if (tmdbId in sonarrDownloadingTmdb) {
-            const data = sonarrDownloadingTmdb[tmdbId];
-            return { status: 'downloading', progress: data.progress, arrUrl: data.sonarr_url, hasEpisodes: data.has_episodes };
-        }
-        // Check queued
-        if (tvdbId in sonarrQueuedTvdb) {
-            return { status: 'queued', progress: 0, arrUrl: sonarrQueuedTvdb[tvdbId].sonarr_url };
-        }
-        if (tmdbId in sonarrQueuedTmdb) {
-            return { status: 'queued', progress: 0, arrUrl: sonarrQueuedTmdb[tmdbId].sonarr_url };
-        }
+// Get item status and progress from the server's annotation
+function getItemStatus(item) {
+    const library = item.library;
+    if (!library) {
+        return { status: 'not_added', progress: 0, arrUrl: null };
     }
-    return { status: 'not_added', progress: 0, arrUrl: null };
+    return { status: library.status, progress: library.progress, arrUrl: library.arr_url, hasEpisodes: library.has_episodes };
 }
 
 // Create card element
+function localPoster(url, width) {
+    const match = TMDB_IMAGE_URL.exec(url);
+    return match ? `/img/${width}/${match[1]}` : url;
+}
+
+function posterSrcset(url) {
+    if (!url || !TMDB_IMAGE_URL.test(url)) return '';
+    const srcset = POSTER_WIDTHS.map(width => `${localPoster(url, width)} ${width.slice(1)}w`).join(', ');
+    return `srcset="${srcset}" sizes="${POSTER_SIZES}"`;
+}
+
 function createCard(item) {
     const div = document.createElement('div');
     div.className = 'poster-card bg-gray-800 rounded-lg overflow-hidden';
 
     const { status, progress, arrUrl, hasEpisodes } = getItemStatus(item);
-    const posterUrl = item.poster || 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" width="200" height="300" viewBox="0 0 200 300"><rect fill="%23374151" width="200" height="300"/><text fill="%239CA3AF" font-family="sans-serif" font-size="14" x="50%" y="50%" text-anchor="middle">No Poster</text></svg>';
+    const posterUrl = item.poster ? localPoster(item.poster, 'w342') : 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" width="200" height="300" viewBox="0 0 200 300"><rect fill="%23374151" width="200" height="300"/><text fill="%239CA3AF" font-family="sans-serif" font-size="14" x="50%" y="50%" text-anchor="middle">No Poster</text></svg>';
     const plexSearchUrl = `${plexUrl}#!/search?query=${encodeURIComponent(item.title)}`;
     const tmdbUrl = currentTab === 'movies'
         ? `https://www.themoviedb.org/movie/${item.tmdb_id}`
@@ -256,7 +341,7 @@ function createCard(item) {
     div.innerHTML = `
         <div class="relative">
             <a href="${tmdbUrl}" target="_blank" class="block cursor-pointer">
-                <img src="${posterUrl}" alt="${item.title}" class="w-full aspect-[2/3] object-cover">
+                <img src="${posterUrl}" ${posterSrcset(item.poster)} alt="${item.title}" loading="lazy" class="w-full aspect-[2/3] object-cover">
             </a>
             ${statusBadge}
             ${item.rating ? `<span class="absolute bottom-2 left-2 bg-black/70 text-xs px-2 py-1 rounded">${item.rating}</span>` : ''}
@@ -285,13 +370,45 @@ function openAddModal(item) {
     currentItem = item;
     modalTitle.textContent = `Add "${item.title}"`;
 
-    // Load appropriate profiles
-    const profiles = currentTab === 'movies' ? radarrProfiles : sonarrProfiles;
-    qualityProfile.innerHTML = profiles.map(p =>
-        `<option value="${p.id}">${p.name}</option>`
-    ).join('');
+    // With several instances, the add goes where the server's add rules send it unless one is chosen
+    const instances = [...new Set(currentProfiles().map(p => p.instance))];
+    addInstanceField.classList.toggle('hidden', instances.length < 2);
+    addInstance.innerHTML = '<option value="">Automatic</option>' +
+        instances.map(name => `<option value="${name}">${name}</option>`).join('');
+    renderProfileOptions();
 
     addModal.classList.remove('hidden');
+    prefetchLookup(item);
+}
+
+// Warm the server's *arr lookup while the user picks a profile, so the add is a single POST
+function prefetchLookup(item) {
+    const endpoint = currentTab === 'movies' ? '/api/radarr/lookup/prefetch' : '/api/sonarr/lookup/prefetch';
+    const body = currentTab === 'movies'
+        ? { tmdb_id: item.tmdb_id }
+        : { tmdb_id: item.tmdb_id, tvdb_id: item.tvdb_id };
+
+    fetch(endpoint, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body),
+    }).catch(() => {});
+}
+
+// Profiles of the chosen instance, or of every instance (labelled with it) when none is chosen
+function renderProfileOptions() {
+    const profiles = currentProfiles();
+    const multiple = new Set(profiles.map(p => p.instance)).size > 1;
+    const chosen = addInstance.value;
+    qualityProfile.innerHTML = profiles
+        .map((p, i) => ({ p, i }))
+        .filter(({ p }) => !chosen || p.instance === chosen)
+        .map(({ p, i }) => `<option value="${i}">${multiple && !chosen ? `${p.instance}: ` : ''}${p.name}</option>`)
+        .join('');
+}
+
+function currentProfiles() {
+    return currentTab === 'movies' ? radarrProfiles : sonarrProfiles;
 }
 
 function closeModal() {
@@ -302,12 +419,16 @@ function closeModal() {
 async function confirmAdd() {
     if (!currentItem) return;
 
-    const profileId = parseInt(qualityProfile.value);
+    const profile = currentProfiles()[parseInt(qualityProfile.value)];
+    if (!profile) return;
     const endpoint = currentTab === 'movies' ? '/api/radarr/add' : '/api/sonarr/add';
 
     const body = currentTab === 'movies'
-        ? { tmdb_id: currentItem.tmdb_id, quality_profile_id: profileId }
-        : { tmdb_id: currentItem.tmdb_id, tvdb_id: currentItem.tvdb_id, quality_profile_id: profileId };
+        ? { tmdb_id: currentItem.tmdb_id }
+        : { tmdb_id: currentItem.tmdb_id, tvdb_id: currentItem.tvdb_id };
+    body.quality_profile_id = profile.id;
+    body.profile_instance = profile.instance;
+    if (addInstance.value) body.instance = addInstance.value;
 
     try {
         const response = await fetch(endpoint, {
@@ -321,15 +442,7 @@ async function confirmAdd() {
         if (data.success) {
             showToast(`Added "${currentItem.title}" successfully!`, 'success');
 
-            // Update local library state (mark as downloading with 0% progress)
-            if (currentTab === 'movies') {
-                radarrDownloading[currentItem.tmdb_id] = { progress: 0, radarr_url: null };
-            } else {
-                if (currentItem.tvdb_id) sonarrDownloadingTvdb[currentItem.tvdb_id] = { progress: 0, sonarr_url: null, has_episodes: false };
-                if (currentItem.tmdb_id) sonarrDownloadingTmdb[currentItem.tmdb_id] = { progress: 0, sonarr_url: null, has_episodes: false };
-            }
-
-            // Refresh display
+            // Refresh display; items come back annotated with the new library entry
             if (isSearchMode) {
                 search();
             } else {
@@ -345,36 +458,138 @@ async function confirmAdd() {
     closeModal();
 }
 
-// Library loading
-async function loadRadarrLibrary() {
+// Library status
+function libraryState(state, entry) {
+    return {
+        status: state,
+        progress: state === 'downloaded' ? 100 : (entry.progress || 0),
+        arr_url: entry.radarr_url || entry.sonarr_url,
+        has_episodes: entry.has_episodes,
+    };
+}
+
+// [id type, id] pairs an item is keyed by in a library delta; movies have a single tmdb map
+function libraryKeys(item) {
+    if (item.media_type === 'movie') return [[null, item.tmdb_id]];
+    return [['tvdb', item.tvdb_id], ['tmdb', item.tmdb_id]].filter(([, id]) => id);
+}
+
+function deltaMap(maps, state, idType) {
+    const map = maps?.[state];
+    return idType ? map?.[idType] : map;
+}
+
+// Apply a pushed library delta to the items on screen; returns true if any changed
+function applyLibraryDelta(library) {
+    const mediaType = library.service === 'radarr' ? 'movie' : 'tv';
+    let changed = false;
+
+    currentItems.forEach(item => {
+        if (item.media_type !== mediaType) return;
+        const keys = libraryKeys(item);
+
+        if (item.library) {
+            const removed = keys.some(([idType, id]) => (deltaMap(library.removed, item.library.status, idType) || []).map(String).includes(String(id)));
+            if (removed) {
+                item.library = null;
+                changed = true;
+            }
+        }
+
+        for (const state of LIBRARY_STATES) {
+            const found = keys.find(([idType, id]) => deltaMap(library.changed, state, idType)?.[id]);
+            if (found) {
+                item.library = libraryState(state, deltaMap(library.changed, state, found[0])[found[1]]);
+                changed = true;
+                break;
+            }
+        }
+    });
+    return changed;
+}
+
+// Live library changes pushed by the server
+function subscribeToEvents() {
+    if (!window.EventSource) return;
+
+    const source = new EventSource('/api/events');
+    // A refused stream (the server caps them) isn't retried by the browser; try again later
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) setTimeout(subscribeToEvents, EVENTS_RETRY_MS);
+    };
+    source.addEventListener('library', (e) => {
+        const library = JSON.parse(e.data);
+        if (library.full) return;  // Deltas only; full re-checks come from refreshStatus()
+
+        if (applyLibraryDelta(library)) {
+            renderContent(currentItems);
+        }
+    });
+}
+
+// Re-check the library status of the items on screen, in case an event was missed
+async function refreshStatus() {
+    const shown = currentItems;
+    const items = shown.slice(0, STATUS_BATCH);
+    if (!items.length) return;
+
     try {
-        const response = await fetch('/api/radarr/library');
+        const response = await fetch('/api/library/status', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                type: currentTab === 'movies' ? 'movie' : 'tv',
+                items: items.map(item => ({ tmdb_id: item.tmdb_id, tvdb_id: item.tvdb_id })),
+            }),
+        });
         const data = await response.json();
-        if (data.success) {
-            radarrDownloaded = data.data.downloaded;  // {tmdb_id: {radarr_url}}
-            radarrDownloading = data.data.downloading;  // {tmdb_id: {progress, radarr_url}}
-            radarrQueued = data.data.queued || {};  // {tmdb_id: {radarr_url}}
-        }
+        // Drop the answer if the grid was replaced meanwhile
+        if (!data.success || shown !== currentItems) return;
+
+        let changed = false;
+        data.data.forEach((library, i) => {
+            if (JSON.stringify(library) !== JSON.stringify(items[i].library || null)) {
+                items[i].library = library;
+                changed = true;
+            }
+        });
+        if (changed) renderContent(currentItems);
     } catch (e) {
-        console.error('Failed to load Radarr library:', e);
+        console.error('Failed to refresh library status:', e);
     }
 }
 
-async function loadSonarrLibrary() {
+// Returns false if the bootstrap request failed entirely
+async function loadBootstrap() {
+    showLoading();
+    hideError();
+
     try {
-        const response = await fetch('/api/sonarr/library');
+        const response = await fetch(`/api/bootstrap?tab=${currentTab}&annotate=1`);
         const data = await response.json();
-        if (data.success) {
-            sonarrDownloadedTvdb = data.data.downloaded.tvdb;  // {tvdb_id: {sonarr_url}}
-            sonarrDownloadedTmdb = data.data.downloaded.tmdb;  // {tmdb_id: {sonarr_url}}
-            sonarrDownloadingTvdb = data.data.downloading.tvdb;  // {tvdb_id: {progress, sonarr_url, has_episodes}}
-            sonarrDownloadingTmdb = data.data.downloading.tmdb;  // {tmdb_id: {progress, sonarr_url, has_episodes}}
-            sonarrQueuedTvdb = data.data.queued?.tvdb || {};  // {tvdb_id: {sonarr_url}}
-            sonarrQueuedTmdb = data.data.queued?.tmdb || {};  // {tmdb_id: {sonarr_url}}
+        if (!data.success) return false;
+
+        const sections = data.data;
+        Object.entries(data.errors || {}).forEach(([section, message]) => {
+            console.error(`Failed to load ${section}:`, message);
+        });
+
+        if (sections.radarr_profiles) radarrProfiles = sections.radarr_profiles;
+        if (sections.sonarr_profiles) sonarrProfiles = sections.sonarr_profiles;
+        if (sections.plex_url) plexUrl = sections.plex_url;
+
+        if (sections[currentTab]) {
+            nextCursor = sections.next_cursor;
+            renderContent(sections[currentTab]);
+        } else {
+            showError(data.errors?.[currentTab] || 'Failed to load content');
         }
     } catch (e) {
-        console.error('Failed to load Sonarr library:', e);
+        return false;
+    } finally {
+        hideLoading();
     }
+    return true;
 }
 
 async function loadRadarrProfiles() {